@@ -1,35 +1,218 @@
 """
 Unified configuration file for the Telegram Summarizer project.
 """
+import codecs
+import functools
 import os
-from pathlib import Path
-from dotenv import load_dotenv
 
-# Load environment variables from .env file at the project root
-# This allows all config variables to be loaded from one place
-load_dotenv()
-
-# --- Project Structure ---
-# Use pathlib to define paths relative to the project root
-BASE_DIR = Path(__file__).resolve().parent
-DATA_DIR = BASE_DIR / "data"
-
-# --- Database ---
-DB_PATH = DATA_DIR / "telegram_messages.db"
+# Public names; paths and secrets are resolved lazily via __getattr__,
+# which `from config import *` also goes through.
+__all__ = (
+    "SESSION_NAME",
+    "BASE_DIR",
+    "DATA_DIR",
+    "DB_PATH",
+    "SESSION_PATH",
+    "LOG_PATH",
+    "ensure_data_dir",
+    "API_ID",
+    "API_HASH",
+    "BOT_TOKEN",
+    "GIGACHAT_CLIENT_ID",
+    "GIGACHAT_CLIENT_SECRET",
+    "GIGACHAT_MAX_WORKERS",
+    "PRODUCTION",
+    "get_secret",
+    "get_int",
+)
 
 # --- Telethon Scraper ---
-# Get your credentials from https://my.telegram.org/apps
-API_ID = os.getenv("API_ID")
-API_HASH = os.getenv("API_HASH")
 SESSION_NAME = 'telegram_session'
-SESSION_PATH = DATA_DIR / SESSION_NAME
 
-# --- Telegram Bot (pyTelegramBotAPI) ---
-BOT_TOKEN = os.getenv("BOT_TOKEN")
+# --- Paths ---
+# Paths are built lazily on first attribute access (see __getattr__ below) and
+# cached in the module globals, so commands that never touch the filesystem
+# (e.g. `run.py --help`) do not pay for them. They are plain strings: SQLite,
+# Telethon and logging consume them as such, so pathlib buys nothing here.
+_PATHS = {
+    # Project structure, relative to the project root.
+    # No realpath(): __file__ is already absolute and resolving symlinks would
+    # stat every ancestor directory.
+    "BASE_DIR": lambda: os.path.dirname(os.path.abspath(__file__)),
+    "DATA_DIR": lambda: os.path.join(_path("BASE_DIR"), "data"),
+    # Database
+    "DB_PATH": lambda: os.path.join(_path("DATA_DIR"), "telegram_messages.db"),
+    # Telethon Scraper
+    "SESSION_PATH": lambda: os.path.join(_path("DATA_DIR"), SESSION_NAME),
+    # Logging
+    "LOG_PATH": lambda: os.path.join(_path("DATA_DIR"), "telegram_bot.log"),
+}
+
+
+def _path(name):
+    """Builds a path from _PATHS on first use and caches it in the module globals."""
+    value = globals().get(name)
+    if value is None:
+        value = globals()[name] = _PATHS[name]()
+    return value
+
+
+@functools.cache
+def ensure_data_dir() -> str:
+    """
+    Creates the data directory if it does not exist and returns its path.
+
+    Cached, so the mkdir happens once per process however many components
+    call it. Consumers should use this instead of creating DATA_DIR themselves.
+    """
+    data_dir = _path("DATA_DIR")
+    os.makedirs(data_dir, exist_ok=True)
+    return data_dir
+
+
+# --- Secrets ---
+# Variables loaded from the .env file at the project root. They are resolved
+# lazily through the module-level __getattr__ below, so importing config does
+# not parse .env until a secret is actually requested.
+_ENV_VARS = frozenset({
+    # Telethon Scraper: get your credentials from https://my.telegram.org/apps
+    "API_ID",
+    "API_HASH",
+    # Telegram Bot (pyTelegramBotAPI)
+    "BOT_TOKEN",
+    # GigaChat
+    "GIGACHAT_CLIENT_ID",
+    "GIGACHAT_CLIENT_SECRET",
+    "GIGACHAT_MAX_WORKERS",
+    # Web dashboard: "1" serves it with gunicorn instead of the Flask dev server
+    "PRODUCTION",
+})
+
+
+@functools.cache
+def _env_patterns():
+    """
+    Compiles the .env regexes on first use.
+
+    Only processes that read a secret parse .env, so the others (and the
+    `import config` every component does) skip loading re and compiling them.
+    Returns (entry, double-quoted escape, single-quoted escape, inline comment).
+    """
+    import re
+
+    # One .env entry per match: an optional `export`, the key and a
+    # single-quoted, double-quoted (both may span lines) or unquoted value.
+    # The trailing [^\r\n]* swallows comments after a quoted value as well as
+    # comment, blank and unparsable lines, which leave the key group empty.
+    entry = re.compile(r"""
+        ^[ \t]*
+        (?:
+            (?:export[ \t]+)?
+            (?P<key>[^=\#\s]+)
+            [ \t]*=[ \t]*
+            (?:
+                '(?P<single>(?:\\'|[^'])*)'
+              | "(?P<double>(?:\\"|[^"])*)"
+              | (?P<unquoted>[^\r\n]*)
+            )
+        )?
+        [^\r\n]*$
+    """, re.MULTILINE | re.VERBOSE)
+    # Escapes python-dotenv decodes inside double and single quotes
+    double_quoted_escape = re.compile(r"""\\[\\'"abfnrtv]""")
+    single_quoted_escape = re.compile(r"""\\[\\']""")
+    # Inline comment after an unquoted value; as in python-dotenv, "#" only
+    # starts a comment when preceded by whitespace (a=b#c keeps "b#c")
+    inline_comment = re.compile(r"\s+#.*")
+    return entry, double_quoted_escape, single_quoted_escape, inline_comment
+
+
+def _parse_env(path):
+    """
+    Minimal .env parser for the python-dotenv syntax in common use.
+
+    Supports comments, an optional `export ` prefix, single- and
+    double-quoted values (escape sequences such as \\n are decoded in double
+    quotes) and inline ` # comments` after unquoted values. Variable
+    expansion (${VAR}) is not supported.
+    """
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    entry_re, double_quoted_escape_re, single_quoted_escape_re, inline_comment_re = _env_patterns()
+    values = {}
+    for match in entry_re.finditer(content):
+        key = match.group('key')
+        if key is None:
+            continue
+        if match.group('single') is not None:
+            value = single_quoted_escape_re.sub(lambda m: m.group(0)[1], match.group('single'))
+        elif match.group('double') is not None:
+            value = double_quoted_escape_re.sub(
+                lambda m: codecs.decode(m.group(0), 'unicode-escape'), match.group('double')
+            )
+        else:
+            value = inline_comment_re.sub('', match.group('unquoted')).strip()
+        values[key] = value
+    return values
+
+
+@functools.cache
+def _env():
+    """
+    Loads the .env file exactly once per process.
+
+    Returns a plain dict snapshot of the environment, so later lookups are
+    ordinary dict accesses instead of going through the os.environ mapping.
+    As with python-dotenv, variables already set in the environment win over
+    values from the file.
+    """
+    env = dict(os.environ)
+    env_file = os.path.join(_path("BASE_DIR"), ".env")
+    if os.path.isfile(env_file):
+        for key, value in _parse_env(env_file).items():
+            env.setdefault(key, value)
+    return env
+
+
+@functools.cache
+def get_secret(name: str) -> str:
+    """
+    Returns a required secret, raising a clear error if it is not set.
+
+    Validated values are cached, so hot paths (e.g. every GigaChat request)
+    touch the environment only once per secret for the process lifetime.
+    """
+    value = _env().get(name)
+    if not value:
+        raise RuntimeError(f"Missing {name} in .env file")
+    return value
+
+
+@functools.cache
+def get_int(name: str, default: int, minimum: int = 1) -> int:
+    """
+    Returns an optional integer setting, raising a clear error if it is invalid.
+
+    An unset or empty variable gives the default. Anything that is not an
+    integer, or is below the minimum, fails at startup with a message naming
+    the variable instead of a bare ValueError (or a pool of zero workers).
+    """
+    value = _env().get(name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise RuntimeError(f"{name} in .env file must be an integer, got {value!r}") from None
+    if number < minimum:
+        raise RuntimeError(f"{name} in .env file must be at least {minimum}, got {number}")
+    return number
 
-# --- GigaChat ---
-GIGACHAT_CLIENT_ID = os.getenv("GIGACHAT_CLIENT_ID")
-GIGACHAT_CLIENT_SECRET = os.getenv("GIGACHAT_CLIENT_SECRET")
 
-# --- Logging ---
-LOG_PATH = DATA_DIR / "telegram_bot.log"
\ No newline at end of file
+def __getattr__(name):
+    """Resolves paths and secrets on first access (PEP 562)."""
+    if name in _PATHS:
+        return _path(name)
+    if name in _ENV_VARS:
+        return _env().get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,43 +1,79 @@
-import argparse
+import importlib
 import sys
 
-# Add src to the Python path to allow for absolute imports
-sys.path.insert(0, './src')
+__version__ = "0.1.0"
+
+# Static help text for -h/--help
+_HELP = """\
+usage: run.py [-h] [-V] {scrape,bot,web}
+
+Unified entry point for the Telegram Summarizer application.
+
+positional arguments:
+  {scrape,bot,web}  The component of the application to run.
+
+options:
+  -h, --help        show this help message and exit
+  -V, --version     show program's version number and exit
+"""
+
+# Dispatch table: component -> (startup message, module, entry point)
+DISPATCH = {
+    'scrape': ("Starting the message scraper...", 'scraper.main', 'run'),
+    'bot': ("Starting the Telegram summary bot...", 'bot.main', 'run'),
+    'web': ("Starting the Flask web dashboard...", 'web.main', 'run'),
+}
+
+
+def _add_src_to_path():
+    """
+    Adds src to the Python path to allow for absolute imports.
+
+    Resolved relative to this file so run.py works from any working directory;
+    called only once a component is actually about to run. Uses abspath rather
+    than Path.resolve(), which would lstat() every ancestor directory.
+    """
+    import os
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+
+def _usage_error(message):
+    """Prints usage and an argparse-style error to stderr, then exits with code 2."""
+    sys.stderr.write(_HELP.splitlines()[0] + "\n")
+    sys.stderr.write(f"run.py: error: {message}\n")
+    sys.exit(2)
+
 
 def main():
     """
     Unified entry point for the Telegram Summarizer application.
-    
+
     Handles command-line arguments to run different components:
     - scrape: Starts the Telethon scraper to listen for new messages.
     - bot: Starts the Telegram bot for summarizing messages.
     - web: Starts the Flask web dashboard.
+
+    The command line is a single word, so it is checked directly against
+    sys.argv instead of building an argparse parser.
     """
-    parser = argparse.ArgumentParser(
-        description="Unified entry point for the Telegram Summarizer application."
-    )
-    parser.add_argument(
-        "component",
-        choices=['scrape', 'bot', 'web'],
-        help="The component of the application to run."
-    )
-    
-    args = parser.parse_args()
-    
-    if args.component == 'scrape':
-        print("Starting the message scraper...")
-        from scraper.main import run as run_scraper
-        run_scraper()
-    
-    elif args.component == 'bot':
-        print("Starting the Telegram summary bot...")
-        from bot.main import run as run_bot
-        run_bot()
-        
-    elif args.component == 'web':
-        print("Starting the Flask web dashboard...")
-        from web.main import run as run_web
-        run_web()
+    if len(sys.argv) != 2:
+        _usage_error("expected exactly one argument: {scrape,bot,web}")
+
+    cmd = sys.argv[1]
+    if cmd in ('-V', '--version'):
+        print(__version__)
+        sys.exit(0)
+    if cmd in ('-h', '--help'):
+        print(_HELP, end='')
+        sys.exit(0)
+    if cmd not in DISPATCH:
+        choices = ', '.join(repr(c) for c in DISPATCH)
+        _usage_error(f"invalid choice: {cmd!r} (choose from {choices})")
+
+    message, module_name, func_name = DISPATCH[cmd]
+    print(message)
+    _add_src_to_path()
+    importlib.import_module(module_name).__dict__[func_name]()
 
 if __name__ == '__main__':
     main()
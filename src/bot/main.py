@@ -3,21 +3,33 @@ Telegram-бот с интеграцией GigaChat API для суммариза
 """
 import telebot
 import sqlite3
+import hashlib
+import io
 import logging
+import orjson
+import re
 import sys
+import threading
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import requests
+from typing import NamedTuple, Optional
 import urllib3
 
 # Add project root to the Python path
 sys.path.append(str(Path(__file__).resolve().parents[2]))
 
 import config
-from llm.gigachat import get_access_token, CHAT_COMPLETIONS_URL, GigaChatError, GigaChatAuthError, GigaChatAPIError
+from database import init_messages_schema, migrate_summary_keys, pack_message_keys
+from llm.gigachat import get_access_token, count_tokens, authorized_post, CHAT_COMPLETIONS_URL, GigaChatError, GigaChatAuthError, GigaChatAPIError
 
 # Отключаем предупреждения о небезопасных SSL запросах
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Каталог data/ должен существовать до создания файла лога
+config.ensure_data_dir()
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -48,9 +60,13 @@ if ":" not in BOT_TOKEN:
 # Путь к базе данных из конфига
 DB_PATH = config.DB_PATH
 
+# Число потоков обработчиков telebot (по умолчанию у TeleBot их 2): долгий
+# запрос к GigaChat в одном обработчике не должен задерживать ответы остальным
+HANDLER_THREADS = 8
+
 # Создаем экземпляр бота
 try:
-    bot = telebot.TeleBot(BOT_TOKEN)
+    bot = telebot.TeleBot(BOT_TOKEN, num_threads=HANDLER_THREADS)
     logger.info(f"Бот инициализирован успешно (токен: {BOT_TOKEN[:10]}...)")
     logger.info(f"База данных: {DB_PATH}")
 except Exception as e:
@@ -58,29 +74,142 @@ except Exception as e:
     print("Проверьте правильность токена в файле .env")
     raise
 
+# Бюджет токенов на текст одного запроса к GigaChat: контекст модели - 32k
+# токенов, остаток оставлен под системный промпт и ответ
+MAX_PROMPT_TOKENS = 24000
+
+# Максимум параллельных запросов к GigaChat при обработке частей длинного текста
+MAX_WORKERS = config.get_int("GIGACHAT_MAX_WORKERS", 4)
+
+# Общий пул потоков для частей длинного текста. Потоки живут весь срок работы
+# бота: их соединения с базой (см. _get_conn) переиспользуются, а не
+# открываются заново при каждой выжимке. Пул общий для всех воркеров
+# суммаризации, поэтому MAX_WORKERS ограничивает и суммарную параллельность.
+_chunk_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="summary-chunk")
+
+# Признаки ответа GigaChat об ограничении темы: одно регулярное выражение
+# проверяет все ключевые фразы за один проход без копии текста в нижнем регистре
+RESTRICTION_RE = re.compile(
+    r"ограничен|некорректные ответы|чувствительные темы"
+    r"|благодарим за понимание|избежание неправильного толкования",
+    re.IGNORECASE
+)
+
+# Максимальная длина ответа одним сообщением (лимит Telegram - 4096 символов)
+MESSAGE_LENGTH_LIMIT = 4000
+# Сколько сообщений допустимо на один ответ; более длинный текст
+# отправляется файлом
+MAX_REPLY_MESSAGES = 2
+
+# Очередь задач суммаризации: обработчики команд только ставят задачу, а
+# запросы к GigaChat выполняют фоновые воркеры, не занимая потоки telebot
+JOBS = queue.Queue()
+SUMMARY_WORKERS = 2
+
+# Выжимки, которые стоят в очереди или выполняются: chat_id или None для
+# выжимки по всем чатам. Сообщения отмечаются обработанными только после
+# ответа GigaChat, поэтому пересекающиеся задачи суммаризировали бы одни и
+# те же сообщения дважды.
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+# Время жизни записи в кэше ответов GigaChat (секунды)
+SUMMARY_CACHE_TTL = 24 * 60 * 60
+
+# Счетчики попаданий/промахов кэша ответов GigaChat
+_cache_stats = {"hits": 0, "misses": 0}
+
+# SQL-запросы горячего пути. Одни и те же строки запросов на общем
+# соединении берутся из кэша подготовленных выражений sqlite3 без
+# повторного разбора. Условие на текст отсекает медиа и пустые сообщения;
+# "summarized = 0 AND text != '[медиа/файл]'" совпадает с условием частичных
+# индексов из database.create_message_indexes.
+# date хранится как unix-время и форматируется в строку на стороне SQLite;
+# у выражения нет псевдонима, чтобы ORDER BY date шел по колонке и индексу.
+SQL_NEW_MESSAGES = '''
+    SELECT id, chat_id, sender, text, datetime(date, 'unixepoch') 
+    FROM messages 
+    WHERE summarized = 0
+        AND text IS NOT NULL AND text != '[медиа/файл]'
+        AND trim(text, char(32, 9, 10, 13)) != ''
+    ORDER BY date ASC
+'''
+SQL_NEW_MESSAGES_IN_CHAT = '''
+    SELECT id, chat_id, sender, text, datetime(date, 'unixepoch') 
+    FROM messages 
+    WHERE summarized = 0 AND chat_id = ?
+        AND text IS NOT NULL AND text != '[медиа/файл]'
+        AND trim(text, char(32, 9, 10, 13)) != ''
+    ORDER BY date ASC
+'''
+# Дешевая проверка наличия работы: те же условия, что и в выборке выше,
+# но SQLite останавливается на первой подходящей строке индекса
+SQL_HAS_NEW_MESSAGES = '''
+    SELECT 1 FROM messages 
+    WHERE summarized = 0
+        AND text IS NOT NULL AND text != '[медиа/файл]'
+        AND trim(text, char(32, 9, 10, 13)) != ''
+    LIMIT 1
+'''
+SQL_HAS_NEW_MESSAGES_IN_CHAT = '''
+    SELECT 1 FROM messages 
+    WHERE summarized = 0 AND chat_id = ?
+        AND text IS NOT NULL AND text != '[медиа/файл]'
+        AND trim(text, char(32, 9, 10, 13)) != ''
+    LIMIT 1
+'''
+# Время создания формирует SQLite (местное время, как и раньше). Выражение
+# стоит в самом INSERT, а не только в DEFAULT: у таблиц, созданных старыми
+# версиями, значения по умолчанию нет
+SQL_INSERT_SUMMARY = '''
+    INSERT INTO summaries (chat_id, summary_text, message_ids, message_count, created_at)
+    VALUES (?, ?, ?, ?, datetime('now', 'localtime'))
+'''
+SQL_GET_CACHED_SUMMARY = 'SELECT summary FROM summary_cache WHERE key = ? AND created_at >= ?'
+SQL_CACHE_SUMMARY = 'INSERT OR REPLACE INTO summary_cache (key, summary, created_at) VALUES (?, ?, ?)'
+SQL_EXPIRE_CACHE = 'DELETE FROM summary_cache WHERE created_at < ?'
+
+# Соединения с базой данных: по одному на поток обработчиков telebot
+_local = threading.local()
+# Сериализует запись в базу данных между потоками обработчиков
+_write_lock = threading.Lock()
+
+
+def _get_conn() -> sqlite3.Connection:
+    """
+    Возвращает соединение с базой данных для текущего потока.
+    
+    telebot обрабатывает команды в пуле потоков, поэтому каждый поток
+    открывает соединение один раз и переиспользует его между командами,
+    сохраняя кэш страниц SQLite между вызовами.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
+        # Чтение страниц через mmap вместо системных вызовов read()
+        conn.execute("PRAGMA mmap_size=268435456")
+        _local.conn = conn
+    return conn
+
 
 def init_database():
     """Инициализация базы данных - добавляет поле summarized и таблицу summaries."""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = _get_conn()
         cursor = conn.cursor()
         
-        # Проверяем, есть ли колонка summarized
-        cursor.execute("PRAGMA table_info(messages)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'summarized' not in columns:
-            logger.info("Добавление колонки 'summarized' в таблицу messages...")
-            cursor.execute('''
-                ALTER TABLE messages ADD COLUMN summarized INTEGER DEFAULT 0
-            ''')
-            conn.commit()
-            logger.info("Колонка 'summarized' успешно добавлена")
+        # WAL сохраняется в файле базы, поэтому достаточно включить его один раз
+        cursor.execute("PRAGMA journal_mode=WAL")
         
-        # Создаем индекс для быстрого поиска необработанных сообщений
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_summarized ON messages(summarized)
-        ''')
+        # Таблица messages приводится к текущей схеме так же, как в скрейпере:
+        # если бот запущен первым на старой базе, даты в ней еще хранятся
+        # строками, и datetime(date, 'unixepoch') в SQL_NEW_MESSAGES вернул бы
+        # NULL. Здесь же добавляется колонка summarized и создаются индексы
+        # для выборки новых сообщений.
+        init_messages_schema(cursor)
         
         # Создаем таблицу для хранения суммаризаций
         cursor.execute('''
@@ -88,9 +217,9 @@ def init_database():
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 chat_id INTEGER,
                 summary_text TEXT NOT NULL,
-                message_ids TEXT NOT NULL,
+                message_ids BLOB NOT NULL,
                 message_count INTEGER NOT NULL,
-                created_at TEXT NOT NULL
+                created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
             )
         ''')
         
@@ -101,52 +230,105 @@ def init_database():
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_summaries_created_at ON summaries(created_at)
         ''')
+        # Выжимки старых версий хранят ID без чата - дополняем их один раз
+        migrate_summary_keys(cursor)
+        
+        # Кэш ответов GigaChat: ключ - sha256 от модели и промптов
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS summary_cache (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                created_at INTEGER NOT NULL
+            )
+        ''')
+        # По created_at удаляются устаревшие записи (см. cache_summary)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_summary_cache_created_at ON summary_cache(created_at)
+        ''')
         
         conn.commit()
-        conn.close()
         logger.info("База данных инициализирована")
     except Exception as e:
         logger.error(f"Ошибка при инициализации базы данных: {e}")
         raise
 
 
-def get_new_messages(chat_id: int = None) -> list:
+def has_new_messages(chat_id: int = None) -> bool:
     """
-    Получает все новые (не суммаризированные) сообщения из базы данных.
+    Проверяет, есть ли новые сообщения для суммаризации, не выбирая их.
     
     Args:
         chat_id: ID чата (опционально, если None - все чаты)
         
     Returns:
-        Список кортежей (id, chat_id, sender, text, date)
+        True, если есть хотя бы одно новое текстовое сообщение
+    """
+    cursor = _get_conn().cursor()
+    if chat_id:
+        cursor.execute(SQL_HAS_NEW_MESSAGES_IN_CHAT, (chat_id,))
+    else:
+        cursor.execute(SQL_HAS_NEW_MESSAGES)
+    return cursor.fetchone() is not None
+
+
+def get_new_messages(chat_id: int = None):
+    """
+    Получает новые (не суммаризированные) текстовые сообщения из базы данных.
+    
+    Строки читаются из курсора по мере итерации, без загрузки всей выборки
+    в память. Медиа и пустые сообщения отфильтровываются на стороне SQLite.
+    
+    Args:
+        chat_id: ID чата (опционально, если None - все чаты)
+        
+    Yields:
+        Кортежи (id, chat_id, sender, text, date)
+        
+    Raises:
+        sqlite3.Error: При ошибке чтения, в том числе посреди итерации
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        cursor = _get_conn().cursor()
         
         if chat_id:
-            cursor.execute('''
-                SELECT id, chat_id, sender, text, date 
-                FROM messages 
-                WHERE summarized = 0 AND chat_id = ?
-                ORDER BY date ASC
-            ''', (chat_id,))
+            cursor.execute(SQL_NEW_MESSAGES_IN_CHAT, (chat_id,))
         else:
-            cursor.execute('''
-                SELECT id, chat_id, sender, text, date 
-                FROM messages 
-                WHERE summarized = 0
-                ORDER BY date ASC
-            ''')
-        
-        messages = cursor.fetchall()
-        conn.close()
-        
-        logger.info(f"Найдено {len(messages)} новых сообщений для суммаризации")
-        return messages
+            cursor.execute(SQL_NEW_MESSAGES)
+        
+        count = 0
+        for row in cursor:
+            count += 1
+            yield row
+        
+        logger.info(f"Найдено {count} новых сообщений для суммаризации")
     except Exception as e:
         logger.error(f"Ошибка при получении новых сообщений: {e}")
-        return []
+        # Оборванная выборка неотличима от полной: без исключения по ней
+        # была бы создана выжимка и сообщения отмечены как обработанные
+        raise
+
+
+def collect_new_messages(chat_id: int = None) -> tuple:
+    """
+    Собирает новые сообщения в один текст для суммаризации.
+    
+    Args:
+        chat_id: ID чата (опционально, если None - все чаты)
+        
+    Returns:
+        Кортеж (текст вида "[date] sender: text", разделенный пустыми строками;
+        список ключей (chat_id, id) вошедших в него сообщений)
+    """
+    buf = io.StringIO()
+    message_ids = []
+    
+    for msg_id, msg_chat_id, sender, text, date in get_new_messages(chat_id):
+        if message_ids:
+            buf.write("\n\n")
+        buf.write(f"[{date}] {sender}: {text}")
+        message_ids.append((msg_chat_id, msg_id))
+    
+    return buf.getvalue(), message_ids
 
 
 def save_summary(chat_id: int, summary_text: str, message_ids: list):
@@ -156,119 +338,239 @@ def save_summary(chat_id: int, summary_text: str, message_ids: list):
     Args:
         chat_id: ID чата (может быть None для всех чатов)
         summary_text: Текст суммаризации
-        message_ids: Список ID сообщений, которые были суммаризированы
+        message_ids: Список ключей (chat_id, id) суммаризированных сообщений
     """
     if not message_ids:
         return
     
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        from datetime import datetime
-        
-        # Сохраняем суммаризацию
-        message_ids_str = ','.join(map(str, message_ids))
-        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn = _get_conn()
+    with _write_lock:
+        try:
+            # Ключи упакованы в BLOB по 8 байт на число вместо строки через запятую
+            ids_blob = pack_message_keys(message_ids)
+            
+            # Одна транзакция на всю операцию - один fsync вместо нескольких.
+            # Контекстный менеджер делает COMMIT или ROLLBACK при ошибке.
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                
+                # Сохраняем суммаризацию
+                cursor.execute(SQL_INSERT_SUMMARY, (chat_id, summary_text, ids_blob, len(message_ids)))
+                
+                # Отмечаем сообщения как обработанные. Ключи (chat_id, id)
+                # складываются во временную таблицу, а UPDATE ищет их по
+                # первичному ключу messages - без огромного IN-списка и лимита
+                # SQLite на параметры. ID уникальны только внутри чата, поэтому
+                # отбор идет по паре, а не по одному id.
+                cursor.execute('''
+                    CREATE TEMP TABLE IF NOT EXISTS _todo (
+                        chat_id INTEGER NOT NULL,
+                        id INTEGER NOT NULL,
+                        PRIMARY KEY (chat_id, id)
+                    ) WITHOUT ROWID
+                ''')
+                cursor.execute('DELETE FROM _todo')
+                cursor.executemany('INSERT OR IGNORE INTO _todo (chat_id, id) VALUES (?, ?)', message_ids)
+                cursor.execute('''
+                    UPDATE messages 
+                    SET summarized = 1 
+                    WHERE (chat_id, id) IN (SELECT chat_id, id FROM _todo)
+                ''')
+            
+            logger.info(f"Суммаризация сохранена: {len(message_ids)} сообщений, chat_id={chat_id}")
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении суммаризации: {e}")
+            raise
+
+
+def _summary_cache_key(request_data: dict) -> str:
+    """
+    Вычисляет ключ кэша для запроса к GigaChat.
+    
+    Args:
+        request_data: Тело запроса к chat/completions
         
-        cursor.execute('''
-            INSERT INTO summaries (chat_id, summary_text, message_ids, message_count, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (chat_id, summary_text, message_ids_str, len(message_ids), created_at))
-        
-        # Отмечаем сообщения как обработанные
-        placeholders = ','.join('?' * len(message_ids))
-        cursor.execute(f'''
-            UPDATE messages 
-            SET summarized = 1 
-            WHERE id IN ({placeholders})
-        ''', message_ids)
+    Returns:
+        sha256 (hex) от модели и содержимого всех сообщений промпта
+    """
+    parts = [request_data["model"]] + [m["content"] for m in request_data["messages"]]
+    return hashlib.sha256("\x00".join(parts).encode('utf-8')).hexdigest()
+
+
+def get_cached_summary(key: str):
+    """
+    Возвращает summary из кэша, если запись есть и не устарела.
+    
+    Args:
+        key: Ключ кэша (см. _summary_cache_key)
         
-        conn.commit()
-        conn.close()
-        logger.info(f"Суммаризация сохранена: {len(message_ids)} сообщений, chat_id={chat_id}")
+    Returns:
+        Текст summary или None при промахе
+    """
+    try:
+        row = _get_conn().execute(
+            SQL_GET_CACHED_SUMMARY,
+            (key, int(time.time()) - SUMMARY_CACHE_TTL)
+        ).fetchone()
     except Exception as e:
-        logger.error(f"Ошибка при сохранении суммаризации: {e}")
-        raise
+        logger.warning(f"Ошибка при чтении кэша summary: {e}")
+        return None
+    
+    _cache_stats["hits" if row else "misses"] += 1
+    logger.info(
+        f"Кэш summary: {'попадание' if row else 'промах'} "
+        f"(попаданий: {_cache_stats['hits']}, промахов: {_cache_stats['misses']})"
+    )
+    return row[0] if row else None
+
+
+def cache_summary(key: str, summary: str):
+    """
+    Сохраняет summary в кэш.
+    
+    В той же транзакции удаляются записи старше SUMMARY_CACHE_TTL: читать
+    их уже не будут, а иначе таблица росла бы без ограничений.
+    
+    Args:
+        key: Ключ кэша (см. _summary_cache_key)
+        summary: Текст summary
+    """
+    conn = _get_conn()
+    with _write_lock:
+        try:
+            now = int(time.time())
+            with conn:
+                conn.execute(SQL_EXPIRE_CACHE, (now - SUMMARY_CACHE_TTL,))
+                conn.execute(SQL_CACHE_SUMMARY, (key, summary, now))
+        except Exception as e:
+            logger.warning(f"Ошибка при записи в кэш summary: {e}")
+
+
+def measure_paragraphs(paragraphs: list, chunk_size: int, token: str) -> tuple:
+    """
+    Измеряет размер абзацев для разбиения текста на части.
+    
+    GigaChat ограничивает запросы по токенам, а не по символам, поэтому
+    размеры по возможности считаются токенизатором GigaChat (одним запросом
+    на все абзацы). Если подсчет недоступен, используется длина в символах.
+    
+    Args:
+        paragraphs: Список абзацев
+        chunk_size: Размер части текста в символах (для запасного варианта)
+        token: Access token GigaChat
+        
+    Returns:
+        Кортеж (размеры абзацев, бюджет на одну часть, размер разделителя)
+    """
+    try:
+        return count_tokens(paragraphs, access_token=token), MAX_PROMPT_TOKENS, 1
+    except GigaChatError as e:
+        logger.warning(f"Не удалось посчитать токены, разбиваю текст по символам: {e}")
+        return [len(p) for p in paragraphs], chunk_size, 2
 
 
-def generate_summary_chunked(text: str, chunk_size: int = 30000) -> str:
+def generate_summary_chunked(text: str, chunk_size: int = 30000, token: str = None) -> str:
     """
     Генерирует summary для длинного текста, разбивая его на части.
     
     Args:
         text: Текст для суммаризации
-        chunk_size: Размер части текста
+        chunk_size: Размер части текста в символах, если токены посчитать не удалось
+        token: Access token GigaChat (опционально, если None - берется из get_access_token)
         
     Returns:
         Объединенная выжимка всех частей
     """
-    logger.info(f"Разбиваю текст на части (размер части: {chunk_size})")
+    # Один токен на все части вместо повторной аутентификации для каждой
+    token = token or get_access_token()
+    
+    paragraphs = text.split('\n\n')
+    sizes, budget, separator_size = measure_paragraphs(paragraphs, chunk_size, token)
+    
+    # Текст, который умещается в бюджет по токенам, отправляется целиком
+    if sum(sizes) + separator_size * (len(sizes) - 1) <= budget:
+        logger.info("Текст умещается в лимит токенов, отправляю одним запросом")
+        return generate_summary(text, max_length=len(text), token=token)
     
-    # Разбиваем текст на части по абзацам для лучшей структуры
+    logger.info(f"Разбиваю текст на части (размер части: {budget})")
+    
+    # Разбиваем текст на части по абзацам для лучшей структуры.
+    # Текущая часть копится списком фрагментов и склеивается один раз при
+    # сбросе: += на строке копировал бы весь накопленный буфер на каждом шаге.
     chunks = []
-    current_chunk = ""
+    current_parts = []
+    current_len = 0
     
-    paragraphs = text.split('\n\n')
+    def flush():
+        nonlocal current_len
+        if current_parts:
+            chunks.append(''.join(current_parts).strip())
+            current_parts.clear()
+            current_len = 0
+    
+    def add(piece: str, piece_size: float):
+        nonlocal current_len
+        if current_len + piece_size > budget:
+            flush()
+        current_parts.append(piece)
+        current_len += piece_size
     
-    for paragraph in paragraphs:
-        if len(current_chunk) + len(paragraph) + 2 <= chunk_size:
-            current_chunk += paragraph + '\n\n'
+    for paragraph, paragraph_size in zip(paragraphs, sizes):
+        # Если один абзац больше бюджета, разбиваем его по предложениям.
+        # Размер предложения оценивается пропорционально его доле в абзаце.
+        if current_len + paragraph_size + separator_size > budget and paragraph_size > budget:
+            flush()
+            size_per_char = paragraph_size / len(paragraph)
+            for sentence in paragraph.split('. '):
+                add(sentence + '. ', len(sentence) * size_per_char + separator_size)
         else:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            # Если один абзац больше chunk_size, разбиваем его по предложениям
-            if len(paragraph) > chunk_size:
-                sentences = paragraph.split('. ')
-                for sentence in sentences:
-                    if len(current_chunk) + len(sentence) + 2 <= chunk_size:
-                        current_chunk += sentence + '. '
-                    else:
-                        if current_chunk:
-                            chunks.append(current_chunk.strip())
-                        current_chunk = sentence + '. '
-            else:
-                current_chunk = paragraph + '\n\n'
+            add(paragraph + '\n\n', paragraph_size + separator_size)
     
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    flush()
     
     logger.info(f"Текст разбит на {len(chunks)} частей")
     
-    # Генерируем summary для каждой части
-    summaries = []
-    for i, chunk in enumerate(chunks, 1):
+    def summarize_chunk(i: int, chunk: str) -> str:
         logger.info(f"Обрабатываю часть {i}/{len(chunks)} ({len(chunk)} символов)...")
         try:
-            # Используем рекурсивный вызов generate_summary, но с меньшим max_length
-            chunk_summary = generate_summary(chunk, max_length=chunk_size)
-            summaries.append(chunk_summary)
+            # Часть уже умещается в бюджет, повторно ее не разбиваем
+            return generate_summary(chunk, max_length=len(chunk), token=token)
         except Exception as e:
             logger.error(f"Ошибка при обработке части {i}: {e}")
-            summaries.append(f"[Часть {i}: ошибка обработки]")
+            return f"[Часть {i}: ошибка обработки]"
+    
+    # Генерируем summary для частей параллельно: запросы к API ограничены
+    # сетью, а не CPU. map сохраняет исходный порядок частей.
+    summaries = list(_chunk_executor.map(summarize_chunk, range(1, len(chunks) + 1), chunks))
     
     # Если получили несколько summary, объединяем их в финальную выжимку
     if len(summaries) > 1:
         logger.info("Объединяю summary частей в финальную выжимку...")
         combined_summaries = "\n\n".join([f"Часть {i+1}:\n{s}" for i, s in enumerate(summaries)])
+        # Короткие выжимки частей отдаем как есть: отдельный запрос к
+        # GigaChat ради их объединения почти ничего не сокращает
+        if len(combined_summaries) < chunk_size // 4:
+            return combined_summaries
         # Создаем финальную выжимку из объединенных summary
         try:
-            final_summary = generate_summary(combined_summaries, max_length=chunk_size)
+            final_summary = generate_summary(combined_summaries, max_length=chunk_size, token=token)
             return final_summary
         except Exception as e:
             logger.warning(f"Не удалось создать финальную выжимку, возвращаю объединенные части: {e}")
-            return "\n\n".join([f"Часть {i+1}:\n{s}" for i, s in enumerate(summaries)])
+            return combined_summaries
     else:
         return summaries[0] if summaries else "Не удалось создать выжимку"
 
 
-def generate_summary(text: str, max_length: int = 30000) -> str:
+def generate_summary(text: str, max_length: int = 30000, token: str = None) -> str:
     """
     Генерирует краткую выжимку текста через GigaChat API.
     
     Args:
         text: Текст для суммаризации
         max_length: Максимальная длина текста для одного запроса (по умолчанию 50000)
+        token: Access token GigaChat (опционально, если None - берется из get_access_token)
         
     Returns:
         Краткая выжимка текста
@@ -277,12 +579,7 @@ def generate_summary(text: str, max_length: int = 30000) -> str:
         # Если текст слишком длинный, разбиваем на части
         if len(text) > max_length:
             logger.info(f"Текст слишком длинный ({len(text)} символов), разбиваю на части...")
-            return generate_summary_chunked(text, max_length)
-        
-        # Получаем токен доступа
-        access_token = get_access_token()
-        
-        logger.info("Отправка запроса на генерацию summary...")
+            return generate_summary_chunked(text, max_length, token)
         
         # Улучшенный промпт для избежания ограничений
         system_prompt = (
@@ -314,20 +611,20 @@ def generate_summary(text: str, max_length: int = 30000) -> str:
             ]
         }
         
-        # Отправка запроса с Bearer токеном
-        response = requests.post(
-            CHAT_COMPLETIONS_URL,
-            json=request_data,
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            },
-            timeout=60,
-            verify=False
-        )
+        # Повторный запрос с тем же текстом отдаем из кэша без обращения к API
+        cache_key = _summary_cache_key(request_data)
+        cached = get_cached_summary(cache_key)
+        if cached:
+            return cached
+        
+        logger.info("Отправка запроса на генерацию summary...")
+        
+        # Отправка запроса с Bearer токеном через общую сессию (keep-alive);
+        # при ответе 401 токен обновляется и запрос повторяется
+        response = authorized_post(CHAT_COMPLETIONS_URL, request_data, token)
         
         if response.status_code == 200:
-            response_data = response.json()
+            response_data = orjson.loads(response.content)
             
             # Извлекаем ответ из структуры ответа GigaChat
             choices = response_data.get("choices", [])
@@ -340,14 +637,7 @@ def generate_summary(text: str, max_length: int = 30000) -> str:
                 raise GigaChatAPIError("Summary не получен в ответе API")
             
             # Проверяем, не является ли ответ сообщением об ограничении
-            summary_lower = summary.lower()
-            restriction_keywords = [
-                "ограничен", "ограничены", "временно ограничены",
-                "некорректные ответы", "чувствительные темы",
-                "благодарим за понимание", "избежание неправильного толкования"
-            ]
-            
-            if any(keyword in summary_lower for keyword in restriction_keywords):
+            if RESTRICTION_RE.search(summary):
                 logger.warning("Получен ответ об ограничении от GigaChat API")
                 raise GigaChatAPIError(
                     "GigaChat API вернул ограничение. Попробуйте разбить запрос на меньшие части "
@@ -355,7 +645,9 @@ def generate_summary(text: str, max_length: int = 30000) -> str:
                 )
             
             logger.info("Summary успешно сгенерирован")
-            return summary.strip()
+            summary = summary.strip()
+            cache_summary(cache_key, summary)
+            return summary
         else:
             error_msg = f"Ошибка API: {response.status_code} - {response.text}"
             logger.error(error_msg)
@@ -369,6 +661,183 @@ def generate_summary(text: str, max_length: int = 30000) -> str:
         raise GigaChatError(error_msg)
 
 
+def reply_with_text(message, text: str):
+    """
+    Отвечает на сообщение текстом результата.
+    
+    Текст длиннее лимита Telegram (4096 символов) делится
+    telebot.util.smart_split по границам строк и предложений, без разрыва
+    слов. Если частей получается больше MAX_REPLY_MESSAGES, текст уходит
+    одним файлом summary.txt: один запрос к API вместо серии сообщений
+    и без риска упереться в лимит частоты отправки.
+    
+    Args:
+        message: Сообщение, на которое отвечает бот
+        text: Текст ответа
+    """
+    if len(text) <= MESSAGE_LENGTH_LIMIT:
+        bot.reply_to(message, text)
+        return
+    
+    pieces = telebot.util.smart_split(text, MESSAGE_LENGTH_LIMIT)
+    if len(pieces) > MAX_REPLY_MESSAGES:
+        bot.send_document(
+            message.chat.id,
+            ("summary.txt", text.encode('utf-8')),
+            reply_to_message_id=message.message_id
+        )
+        return
+    
+    bot.reply_to(message, pieces[0])
+    for piece in pieces[1:]:
+        bot.send_message(message.chat.id, piece)
+
+
+class SummaryJob(NamedTuple):
+    """Задача на суммаризацию для фоновых воркеров."""
+    message: object          # Команда пользователя, на которую отвечает бот
+    chat_id: Optional[int]   # None - выжимка по всем чатам
+    combined_text: str
+    message_ids: list        # Ключи (chat_id, id) сообщений
+    status_message_id: int   # Сообщение "поставлено в очередь", которое редактирует воркер
+
+
+def _claim_summary(chat_id: Optional[int]) -> bool:
+    """
+    Резервирует выжимку для чата, если пересекающейся задачи еще нет.
+    
+    Выжимка по всем чатам (None) пересекается с любой другой, выжимка по
+    чату - с выжимкой по тому же чату и по всем чатам.
+    
+    Args:
+        chat_id: ID чата или None для всех чатов
+        
+    Returns:
+        True, если резерв получен и его нужно снять через _release_summary
+    """
+    with _in_flight_lock:
+        if None in _in_flight or chat_id in _in_flight or (chat_id is None and _in_flight):
+            return False
+        _in_flight.add(chat_id)
+        return True
+
+
+def _release_summary(chat_id: Optional[int]):
+    """Снимает резерв, полученный через _claim_summary."""
+    with _in_flight_lock:
+        _in_flight.discard(chat_id)
+
+
+def _edit_status(job: SummaryJob, text: str):
+    """Заменяет текст статусного сообщения задачи."""
+    bot.edit_message_text(text, job.message.chat.id, job.status_message_id)
+
+
+def _process_summary_job(job: SummaryJob):
+    """
+    Генерирует и сохраняет выжимку для задачи из очереди.
+    
+    Короткий результат заменяет статусное сообщение, длинный отправляется
+    через reply_with_text. Ошибки GigaChat сообщаются пользователю тем же
+    статусным сообщением.
+    """
+    count = len(job.message_ids)
+    try:
+        # Генерируем summary
+        summary = generate_summary(job.combined_text)
+        
+        # Сохраняем суммаризацию в базу данных и отмечаем сообщения как обработанные
+        save_summary(chat_id=job.chat_id, summary_text=summary, message_ids=job.message_ids)
+        
+        # Отправляем результат
+        if job.chat_id is None:
+            result_text = f"📋 Выжимка из {count} сообщений:\n\n{summary}"
+        else:
+            result_text = f"📋 Выжимка из {count} сообщений (чат {job.chat_id}):\n\n{summary}"
+        
+        if len(result_text) > MESSAGE_LENGTH_LIMIT:
+            reply_with_text(job.message, result_text)
+            _edit_status(job, f"✅ Выжимка из {count} сообщений готова.")
+        else:
+            _edit_status(job, result_text)
+        
+        if job.chat_id is None:
+            logger.info(f"Суммаризация завершена для {count} сообщений")
+        else:
+            logger.info(f"Суммаризация завершена для чата {job.chat_id}: {count} сообщений")
+        
+    except GigaChatAuthError as e:
+        error_msg = (
+            "❌ Ошибка аутентификации в GigaChat API\n\n"
+            f"{str(e)}\n\n"
+            "Проверьте настройки CLIENT_ID и CLIENT_SECRET в файле .env"
+        )
+        _edit_status(job, error_msg)
+        logger.error(f"Ошибка аутентификации: {e}")
+        
+    except GigaChatAPIError as e:
+        error_str = str(e)
+        # Проверяем, является ли это ограничением
+        if "ограничение" in error_str.lower() or "ограничен" in error_str.lower():
+            if job.chat_id is None:
+                advice = (
+                    "1. Использовать /summary_chat <chat_id> для конкретного чата (меньше сообщений)\n"
+                    "2. Подождать некоторое время и попробовать снова\n"
+                    "3. Разбить запрос на части вручную"
+                )
+            else:
+                advice = (
+                    "1. Использовать другой chat_id с меньшим количеством сообщений\n"
+                    "2. Подождать некоторое время и попробовать снова\n"
+                    "3. Проверить содержимое сообщений в чате"
+                )
+            error_msg = (
+                "⚠️ GigaChat API вернул ограничение для этого запроса.\n\n"
+                "Попробуйте:\n"
+                f"{advice}"
+            )
+        else:
+            error_msg = (
+                "❌ Ошибка при запросе к GigaChat API\n\n"
+                f"{error_str}\n\n"
+                "Попробуйте позже или проверьте подключение к интернету."
+            )
+        _edit_status(job, error_msg)
+        logger.error(f"Ошибка API: {e}")
+        
+    except GigaChatError as e:
+        error_msg = (
+            "❌ Ошибка GigaChat\n\n"
+            f"{str(e)}"
+        )
+        _edit_status(job, error_msg)
+        logger.error(f"Ошибка GigaChat: {e}")
+
+
+def _summary_worker():
+    """Цикл фонового воркера: берет задачи из очереди JOBS и выполняет их."""
+    while True:
+        job = JOBS.get()
+        try:
+            _process_summary_job(job)
+        except Exception as e:
+            logger.exception("Неожиданная ошибка при суммаризации")
+            try:
+                _edit_status(job, f"❌ Произошла неожиданная ошибка\n\n{str(e)}")
+            except Exception:
+                logger.exception("Не удалось сообщить пользователю об ошибке")
+        finally:
+            _release_summary(job.chat_id)
+            JOBS.task_done()
+
+
+def start_summary_workers(count: int = SUMMARY_WORKERS):
+    """Запускает фоновые потоки-воркеры суммаризации."""
+    for i in range(count):
+        threading.Thread(target=_summary_worker, name=f"summary-worker-{i + 1}", daemon=True).start()
+    logger.info(f"Запущено воркеров суммаризации: {count}")
+
+
 @bot.message_handler(commands=['start', 'help'])
 def send_welcome(message):
     """
@@ -424,26 +893,22 @@ def show_stats(message):
     Показать статистику по базе данных.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Общее количество сообщений
-        cursor.execute('SELECT COUNT(*) FROM messages')
-        total = cursor.fetchone()[0]
+        cursor = _get_conn().cursor()
         
-        # Количество новых (не суммаризированных) сообщений
-        cursor.execute('SELECT COUNT(*) FROM messages WHERE summarized = 0')
-        new = cursor.fetchone()[0]
-        
-        # Количество обработанных сообщений
-        cursor.execute('SELECT COUNT(*) FROM messages WHERE summarized = 1')
-        processed = cursor.fetchone()[0]
-        
-        # Количество уникальных чатов
-        cursor.execute('SELECT COUNT(DISTINCT chat_id) FROM messages')
-        chats = cursor.fetchone()[0]
-        
-        conn.close()
+        # Всего сообщений, новых (не суммаризированных), обработанных
+        # и уникальных чатов - одним проходом по таблице
+        cursor.execute('''
+            SELECT
+                COUNT(*),
+                SUM(CASE WHEN summarized = 0 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN summarized = 1 THEN 1 ELSE 0 END),
+                COUNT(DISTINCT chat_id)
+            FROM messages
+        ''')
+        total, new, processed, chats = cursor.fetchone()
+        # SUM по пустой таблице возвращает NULL
+        new = new or 0
+        processed = processed or 0
         
         stats_text = (
             "📊 Статистика базы данных:\n\n"
@@ -464,41 +929,38 @@ def show_stats(message):
 def summarize_all(message):
     """
     Создать выжимку из всех новых сообщений.
+    
+    Генерация выполняется в фоновом потоке: обработчик только ставит
+    задачу в очередь и сразу освобождается.
     """
+    claimed = queued = False
     try:
-        bot.send_chat_action(message.chat.id, 'typing')
-        
-        # Получаем все новые сообщения
-        new_messages = get_new_messages()
-        
-        if not new_messages:
+        claimed = _claim_summary(None)
+        if not claimed:
             bot.reply_to(
                 message,
-                "✅ Новых сообщений для суммаризации нет.\n\n"
-                "Все сообщения уже обработаны."
+                "⏳ Выжимка уже готовится.\n\n"
+                "Дождитесь результата текущего запроса."
             )
             return
         
-        # Формируем текст из всех новых сообщений
-        messages_text = []
-        message_ids = []
-        
-        for msg_id, chat_id, sender, text, date in new_messages:
-            if text and text.strip() and text != "[медиа/файл]":
-                messages_text.append(f"[{date}] {sender}: {text}")
-                message_ids.append(msg_id)
+        # Сначала дешевая проверка: полная выборка нужна, только если есть работа
+        if has_new_messages():
+            bot.send_chat_action(message.chat.id, 'typing')
+            
+            # Получаем все новые сообщения одним текстом
+            combined_text, message_ids = collect_new_messages()
+        else:
+            message_ids = []
         
-        if not messages_text:
+        if not message_ids:
             bot.reply_to(
                 message,
-                "❌ Не найдено текстовых сообщений для суммаризации.\n\n"
-                "Все сообщения содержат только медиа или файлы."
+                "✅ Новых сообщений для суммаризации нет.\n\n"
+                "Все сообщения уже обработаны."
             )
             return
         
-        # Объединяем все сообщения в один текст
-        combined_text = "\n\n".join(messages_text)
-        
         # Предупреждение при большом количестве сообщений
         warning_text = ""
         if len(message_ids) > 100:
@@ -508,77 +970,15 @@ def summarize_all(message):
                 f"Рекомендуется использовать /summary_chat для конкретного чата.\n\n"
             )
         
-        bot.reply_to(
+        status = bot.reply_to(
             message,
             f"📝 Найдено {len(message_ids)} новых сообщений.{warning_text}"
-            f"Генерирую выжимку...\n\n"
+            f"⏳ Выжимка поставлена в очередь...\n\n"
             f"Это может занять некоторое время."
         )
         
-        # Генерируем summary
-        summary = generate_summary(combined_text)
-        
-        # Сохраняем суммаризацию в базу данных и отмечаем сообщения как обработанные
-        save_summary(chat_id=None, summary_text=summary, message_ids=message_ids)
-        
-        # Отправляем результат
-        result_text = (
-            f"📋 Выжимка из {len(message_ids)} сообщений:\n\n"
-            f"{summary}"
-        )
-        
-        # Разбиваем на части, если сообщение слишком длинное (лимит Telegram - 4096 символов)
-        if len(result_text) > 4000:
-            # Отправляем первую часть
-            bot.reply_to(message, result_text[:4000])
-            # Отправляем остальное
-            remaining = result_text[4000:]
-            while len(remaining) > 4000:
-                bot.send_message(message.chat.id, remaining[:4000])
-                remaining = remaining[4000:]
-            if remaining:
-                bot.send_message(message.chat.id, remaining)
-        else:
-            bot.reply_to(message, result_text)
-        
-        logger.info(f"Суммаризация завершена для {len(message_ids)} сообщений")
-        
-    except GigaChatAuthError as e:
-        error_msg = (
-            "❌ Ошибка аутентификации в GigaChat API\n\n"
-            f"{str(e)}\n\n"
-            "Проверьте настройки CLIENT_ID и CLIENT_SECRET в файле .env"
-        )
-        bot.reply_to(message, error_msg)
-        logger.error(f"Ошибка аутентификации: {e}")
-        
-    except GigaChatAPIError as e:
-        error_str = str(e)
-        # Проверяем, является ли это ограничением
-        if "ограничение" in error_str.lower() or "ограничен" in error_str.lower():
-            error_msg = (
-                "⚠️ GigaChat API вернул ограничение для этого запроса.\n\n"
-                "Попробуйте:\n"
-                "1. Использовать /summary_chat <chat_id> для конкретного чата (меньше сообщений)\n"
-                "2. Подождать некоторое время и попробовать снова\n"
-                "3. Разбить запрос на части вручную"
-            )
-        else:
-            error_msg = (
-                "❌ Ошибка при запросе к GigaChat API\n\n"
-                f"{error_str}\n\n"
-                "Попробуйте позже или проверьте подключение к интернету."
-            )
-        bot.reply_to(message, error_msg)
-        logger.error(f"Ошибка API: {e}")
-        
-    except GigaChatError as e:
-        error_msg = (
-            "❌ Ошибка GigaChat\n\n"
-            f"{str(e)}"
-        )
-        bot.reply_to(message, error_msg)
-        logger.error(f"Ошибка GigaChat: {e}")
+        JOBS.put(SummaryJob(message, None, combined_text, message_ids, status.message_id))
+        queued = True
         
     except Exception as e:
         error_msg = (
@@ -587,6 +987,10 @@ def summarize_all(message):
         )
         bot.reply_to(message, error_msg)
         logger.exception("Неожиданная ошибка при суммаризации")
+    finally:
+        # Резерв поставленной задачи снимает воркер после ее выполнения
+        if claimed and not queued:
+            _release_summary(None)
 
 
 @bot.message_handler(commands=['summary_chat'])
@@ -595,6 +999,8 @@ def summarize_chat(message):
     Создать выжимку для конкретного чата.
     Использование: /summary_chat <chat_id>
     """
+    chat_id = None
+    claimed = queued = False
     try:
         # Парсим команду
         parts = message.text.split()
@@ -613,107 +1019,41 @@ def summarize_chat(message):
             bot.reply_to(message, "❌ chat_id должен быть числом")
             return
         
-        bot.send_chat_action(message.chat.id, 'typing')
-        
-        # Получаем новые сообщения для конкретного чата
-        new_messages = get_new_messages(chat_id=chat_id)
-        
-        if not new_messages:
+        claimed = _claim_summary(chat_id)
+        if not claimed:
             bot.reply_to(
                 message,
-                f"✅ Новых сообщений для чата {chat_id} нет.\n\n"
-                "Все сообщения уже обработаны."
+                f"⏳ Выжимка для чата {chat_id} уже готовится.\n\n"
+                "Дождитесь результата текущего запроса."
             )
             return
         
-        # Формируем текст из всех новых сообщений
-        messages_text = []
-        message_ids = []
-        
-        for msg_id, msg_chat_id, sender, text, date in new_messages:
-            if text and text.strip() and text != "[медиа/файл]":
-                messages_text.append(f"[{date}] {sender}: {text}")
-                message_ids.append(msg_id)
+        # Сначала дешевая проверка: полная выборка нужна, только если есть работа
+        if has_new_messages(chat_id=chat_id):
+            bot.send_chat_action(message.chat.id, 'typing')
+            
+            # Получаем новые сообщения для конкретного чата одним текстом
+            combined_text, message_ids = collect_new_messages(chat_id=chat_id)
+        else:
+            message_ids = []
         
-        if not messages_text:
+        if not message_ids:
             bot.reply_to(
                 message,
-                f"❌ Не найдено текстовых сообщений для чата {chat_id}."
+                f"✅ Новых сообщений для чата {chat_id} нет.\n\n"
+                "Все сообщения уже обработаны."
             )
             return
         
-        # Объединяем все сообщения в один текст
-        combined_text = "\n\n".join(messages_text)
-        
-        bot.reply_to(
+        status = bot.reply_to(
             message,
             f"📝 Найдено {len(message_ids)} новых сообщений в чате {chat_id}.\n"
-            f"Генерирую выжимку...\n\n"
+            f"⏳ Выжимка поставлена в очередь...\n\n"
             f"Это может занять некоторое время."
         )
         
-        # Генерируем summary
-        summary = generate_summary(combined_text)
-        
-        # Сохраняем суммаризацию в базу данных и отмечаем сообщения как обработанные
-        save_summary(chat_id=chat_id, summary_text=summary, message_ids=message_ids)
-        
-        # Отправляем результат
-        result_text = (
-            f"📋 Выжимка из {len(message_ids)} сообщений (чат {chat_id}):\n\n"
-            f"{summary}"
-        )
-        
-        # Разбиваем на части, если сообщение слишком длинное
-        if len(result_text) > 4000:
-            bot.reply_to(message, result_text[:4000])
-            remaining = result_text[4000:]
-            while len(remaining) > 4000:
-                bot.send_message(message.chat.id, remaining[:4000])
-                remaining = remaining[4000:]
-            if remaining:
-                bot.send_message(message.chat.id, remaining)
-        else:
-            bot.reply_to(message, result_text)
-        
-        logger.info(f"Суммаризация завершена для чата {chat_id}: {len(message_ids)} сообщений")
-        
-    except GigaChatAuthError as e:
-        error_msg = (
-            "❌ Ошибка аутентификации в GigaChat API\n\n"
-            f"{str(e)}\n\n"
-            "Проверьте настройки CLIENT_ID и CLIENT_SECRET в файле .env"
-        )
-        bot.reply_to(message, error_msg)
-        logger.error(f"Ошибка аутентификации: {e}")
-        
-    except GigaChatAPIError as e:
-        error_str = str(e)
-        # Проверяем, является ли это ограничением
-        if "ограничение" in error_str.lower() or "ограничен" in error_str.lower():
-            error_msg = (
-                "⚠️ GigaChat API вернул ограничение для этого запроса.\n\n"
-                "Попробуйте:\n"
-                "1. Использовать другой chat_id с меньшим количеством сообщений\n"
-                "2. Подождать некоторое время и попробовать снова\n"
-                "3. Проверить содержимое сообщений в чате"
-            )
-        else:
-            error_msg = (
-                "❌ Ошибка при запросе к GigaChat API\n\n"
-                f"{error_str}\n\n"
-                "Попробуйте позже или проверьте подключение к интернету."
-            )
-        bot.reply_to(message, error_msg)
-        logger.error(f"Ошибка API: {e}")
-        
-    except GigaChatError as e:
-        error_msg = (
-            "❌ Ошибка GigaChat\n\n"
-            f"{str(e)}"
-        )
-        bot.reply_to(message, error_msg)
-        logger.error(f"Ошибка GigaChat: {e}")
+        JOBS.put(SummaryJob(message, chat_id, combined_text, message_ids, status.message_id))
+        queued = True
         
     except Exception as e:
         error_msg = (
@@ -722,6 +1062,10 @@ def summarize_chat(message):
         )
         bot.reply_to(message, error_msg)
         logger.exception("Неожиданная ошибка при суммаризации")
+    finally:
+        # Резерв поставленной задачи снимает воркер после ее выполнения
+        if claimed and not queued:
+            _release_summary(chat_id)
 
 
 @bot.message_handler(func=lambda message: True)
@@ -747,6 +1091,7 @@ def run():
         raise
 
     logger.info(f"База данных: {DB_PATH}")
+    start_summary_workers()
     logger.info("Бот запускается...")
     
     try:
@@ -4,15 +4,310 @@
 Содержит функции для создания таблиц и сохранения сообщений.
 """
 
+import array
+import itertools
+import json
 import sqlite3
+import sys
+import threading
 import asyncio
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional, Tuple, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# Префикс BLOB с парами (chat_id, id). BLOB предыдущего формата (только ID
+# по 8 байт) всегда кратен 8 байтам, поэтому однобайтовый префикс отличает их.
+MESSAGE_KEYS_PREFIX = b'k'
+
+
+def pack_message_keys(keys) -> bytes:
+    """
+    Упаковка ключей сообщений в BLOB для колонки summaries.message_ids.
+    
+    ID сообщений уникальны только внутри чата, поэтому сохраняется пара
+    (chat_id, id). Каждое число хранится как 8-байтовое целое little-endian:
+    компактнее строки через запятую, а разбор не создает объект на каждое число.
+    
+    Args:
+        keys: Последовательность пар (chat_id, id)
+        
+    Returns:
+        Упакованные байты
+    """
+    packed = array.array('q', itertools.chain.from_iterable(keys))
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return MESSAGE_KEYS_PREFIX + packed.tobytes()
+
+
+def unpack_message_keys(
+    blob: Union[bytes, str, None],
+    chat_id: Optional[int] = None
+) -> List[Tuple[Optional[int], int]]:
+    """
+    Распаковка ключей сообщений, сохраненных через pack_message_keys.
+    
+    Понимает и старые форматы без chat_id - строку с ID через запятую и BLOB
+    из одних ID. Для них chat_id берется из аргумента (summaries.chat_id) и
+    у выжимки по всем чатам остается None.
+    
+    Args:
+        blob: Значение колонки summaries.message_ids
+        chat_id: Чат выжимки для записей старого формата
+        
+    Returns:
+        Список пар (chat_id, id)
+    """
+    if not blob:
+        return []
+    if isinstance(blob, str):
+        return [(chat_id, int(i)) for i in blob.split(',') if i.strip()]
+    
+    has_chats = blob[:1] == MESSAGE_KEYS_PREFIX and len(blob) % 8 == 1
+    numbers = array.array('q')
+    numbers.frombytes(blob[1:] if has_chats else blob)
+    if sys.byteorder != 'little':
+        numbers.byteswap()
+    if has_chats:
+        it = iter(numbers.tolist())
+        return list(zip(it, it))
+    return [(chat_id, i) for i in numbers.tolist()]
+
+
+# Схема таблицы messages. date - unix-время в секундах (UTC): целое занимает
+# в индексе меньше места, чем строка, и сравнивается быстрее. summarized
+# заполняет бот при суммаризации.
+# Естественный ключ сообщения - (chat_id, id): ID уникальны только внутри
+# чата. Таблица WITHOUT ROWID хранит строки прямо в B-дереве первичного ключа,
+# без отдельного дерева rowid и индекса под UNIQUE.
+MESSAGES_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        chat_id INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        sender TEXT,
+        text TEXT,
+        date INTEGER NOT NULL,
+        summarized INTEGER DEFAULT 0,
+        PRIMARY KEY (chat_id, id)
+    ) WITHOUT ROWID
+'''
+
+
+# Индексы, которые больше не нужны: их покрывают первичный ключ (chat_id, id)
+# или индексы из create_message_indexes. Каждый лишний индекс замедляет
+# вставку сообщений скрейпером.
+OBSOLETE_MESSAGE_INDEXES = (
+    'idx_chat_id',
+    'idx_message_id',
+    'idx_date',
+    'idx_summarized',
+    'idx_messages_unsummarized',
+    'idx_summarized_date',
+    'idx_messages_new_text_date',
+)
+
+
+def create_message_indexes(cursor: sqlite3.Cursor):
+    """
+    Создание вторичных индексов таблицы messages.
+    
+    Все индексы messages описаны здесь, в одном месте: функцию вызывают и
+    скрейпер, и бот, поэтому набор индексов не зависит от того, какой из
+    компонентов запущен первым.
+    
+    Args:
+        cursor: Курсор соединения с базой данных
+    """
+    for name in OBSOLETE_MESSAGE_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    
+    # Страницы веб-панели: фильтр по summarized и порядок "сначала
+    # новые" читаются прямо из индекса, без сортировки всей выборки.
+    # Порядок (date, chat_id, id) однозначен: одинаковые ID и даты бывают
+    # в разных чатах, и без chat_id курсор страницы пропускал бы строки.
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_messages_summarized_date
+        ON messages(summarized, date DESC, chat_id DESC, id DESC)
+    ''')
+    # Частичный индекс только по новым текстовым сообщениям одного чата -
+    # их выбирает бот для суммаризации, уже упорядоченными по date. Условие
+    # индекса должно буквально совпадать с условием в запросах бота
+    # (SQL_NEW_MESSAGES_IN_CHAT в bot/main.py), иначе SQLite его не применит.
+    # Выборку по всем чатам планировщик и так читает из idx_messages_summarized_date
+    # (summarized = 0 в порядке date), отдельный индекс по date он не выбирал.
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_messages_new_text_chat ON messages(chat_id, date)
+        WHERE summarized = 0 AND text != '[медиа/файл]'
+    ''')
+
+
+def migrate_messages_table(cursor: sqlite3.Cursor):
+    """
+    Одноразовая миграция таблицы messages к текущей схеме.
+    
+    Таблица пересоздается, если она создана старой версией: с rowid и
+    UNIQUE(id, chat_id) вместо WITHOUT ROWID или с датой в TEXT. Ни то, ни
+    другое не меняется через ALTER, а в колонку с типом TEXT числа
+    записываются строками. Колонка summarized, добавленная ботом,
+    переносится как есть.
+    
+    Args:
+        cursor: Курсор соединения с базой данных
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages'")
+    table_sql = cursor.fetchone()[0].upper()
+    cursor.execute("PRAGMA table_info(messages)")
+    columns = {row[1]: row[2] for row in cursor.fetchall()}
+    text_dates = columns.get('date', '').upper() == 'TEXT'
+    if not text_dates and 'WITHOUT ROWID' in table_sql:
+        return
+    
+    logger.info("Перестройка таблицы messages под новую схему...")
+    # Даты сохранялись в UTC, strftime('%s') трактует их так же
+    date = "CAST(strftime('%s', date) AS INTEGER)" if text_dates else 'date'
+    summarized = 'summarized' if 'summarized' in columns else '0'
+    cursor.execute("BEGIN")
+    try:
+        cursor.execute(MESSAGES_TABLE_SQL.format(table='messages_new'))
+        cursor.execute(f'''
+            INSERT INTO messages_new (chat_id, id, sender, text, date, summarized)
+            SELECT chat_id, id, sender, text, {date}, {summarized}
+            FROM messages
+        ''')
+        cursor.execute("DROP TABLE messages")
+        cursor.execute("ALTER TABLE messages_new RENAME TO messages")
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    logger.info("Таблица messages перестроена")
+
+
+def init_counters(cursor: sqlite3.Cursor):
+    """
+    Создание счетчиков новых и обработанных сообщений.
+    
+    Таблица counters поддерживается триггерами на messages, поэтому
+    веб-панель берет количество сообщений одним чтением по первичному
+    ключу вместо COUNT(*) по всей таблице. Если триггеров еще нет (новая
+    база или таблица messages пересоздана миграцией), счетчики
+    заполняются по текущим данным.
+    
+    Args:
+        cursor: Курсор соединения с базой данных
+    """
+    cursor.execute("""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'trigger' AND name IN ('trg_messages_ai', 'trg_messages_au')
+    """)
+    if cursor.fetchone()[0] == 2:
+        return
+    
+    cursor.execute("BEGIN")
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS counters (
+                key TEXT PRIMARY KEY,
+                val INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            INSERT OR REPLACE INTO counters (key, val) VALUES
+                ('new', (SELECT COUNT(*) FROM messages WHERE summarized = 0)),
+                ('processed', (SELECT COUNT(*) FROM messages WHERE summarized = 1))
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_messages_ai AFTER INSERT ON messages
+            BEGIN
+                UPDATE counters SET val = val + 1
+                WHERE key = CASE NEW.summarized WHEN 1 THEN 'processed' WHEN 0 THEN 'new' END;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_messages_au AFTER UPDATE OF summarized ON messages
+            WHEN OLD.summarized IS NOT NEW.summarized
+            BEGIN
+                UPDATE counters SET val = val - 1
+                WHERE key = CASE OLD.summarized WHEN 1 THEN 'processed' WHEN 0 THEN 'new' END;
+                UPDATE counters SET val = val + 1
+                WHERE key = CASE NEW.summarized WHEN 1 THEN 'processed' WHEN 0 THEN 'new' END;
+            END
+        ''')
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+
+
+def init_messages_schema(cursor: sqlite3.Cursor):
+    """
+    Приведение таблицы messages и связанных с ней объектов к текущей схеме.
+    
+    Создает таблицу, при необходимости мигрирует ее, создает индексы и
+    счетчики. Вызывается и скрейпером, и ботом: какой бы компонент ни
+    запустился первым на старой базе, он увидит уже мигрированную таблицу.
+    
+    Args:
+        cursor: Курсор соединения с базой данных (без открытой транзакции)
+    """
+    cursor.execute(MESSAGES_TABLE_SQL.format(table='messages'))
+    migrate_messages_table(cursor)
+    create_message_indexes(cursor)
+    init_counters(cursor)
+
+
+def migrate_summary_keys(cursor: sqlite3.Cursor):
+    """
+    Одноразовый перевод summaries.message_ids к формату pack_message_keys.
+    
+    Старые выжимки хранят только ID сообщений - строкой через запятую или
+    BLOB без chat_id. ID уникальны только внутри чата, а поиск по одному ID
+    не использует первичный ключ (chat_id, id) и читает всю таблицу messages.
+    Поэтому ID один раз дополняются чатом: у выжимки по одному чату он
+    записан в summaries.chat_id, для выжимки по всем чатам берутся
+    обработанные сообщения с этими ID из messages.
+    
+    Args:
+        cursor: Курсор соединения с базой данных (без открытой транзакции)
+    """
+    cursor.execute('''
+        SELECT id, chat_id, message_ids FROM summaries
+        WHERE length(message_ids) > 0 AND NOT (
+            typeof(message_ids) = 'blob'
+            AND substr(message_ids, 1, 1) = ?
+            AND length(message_ids) % 8 = 1
+        )
+    ''', (MESSAGE_KEYS_PREFIX,))
+    legacy = cursor.fetchall()
+    if not legacy:
+        return
+    
+    logger.info(f"Перевод {len(legacy)} выжимок на ключи (chat_id, id)...")
+    cursor.execute("BEGIN")
+    try:
+        for summary_id, chat_id, message_ids in legacy:
+            keys = unpack_message_keys(message_ids, chat_id)
+            if chat_id is None:
+                ids = [message_id for _, message_id in keys]
+                cursor.execute('''
+                    SELECT chat_id, id FROM messages
+                    WHERE summarized = 1 AND id IN (SELECT value FROM json_each(?))
+                ''', (json.dumps(ids),))
+                keys = cursor.fetchall()
+            cursor.execute(
+                "UPDATE summaries SET message_ids = ? WHERE id = ?",
+                (pack_message_keys(keys), summary_id)
+            )
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    logger.info("Выжимки переведены на ключи (chat_id, id)")
+
+
 class Database:
     """Класс для работы с базой данных SQLite."""
     
@@ -24,35 +319,50 @@ class Database:
             db_path: Путь к файлу базы данных
         """
         self.db_path = db_path
+        # Одно долгоживущее соединение на весь процесс: без накладных расходов
+        # на открытие при каждом вызове и с "теплым" кэшем страниц SQLite.
+        # Режим автокоммита - каждая запись фиксируется сразу.
+        self._conn = self._connect()
+        # Сериализует обращения к общему соединению из разных потоков
+        self._lock = threading.Lock()
         self._init_database()
     
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Открытие соединения с настройками для конкурентной записи.
+        
+        synchronous, busy_timeout, temp_store и cache_size действуют только
+        в пределах соединения, поэтому задаются при его открытии.
+        
+        Returns:
+            Соединение с базой данных в режиме автокоммита
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        # В режиме WAL достаточно синхронизации при контрольной точке
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Ждем освобождения блокировки вместо немедленной ошибки "database is locked"
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # Кэш страниц 64 МБ
+        conn.execute("PRAGMA cache_size=-65536")
+        # Ограничение работы ANALYZE, который выполняет PRAGMA optimize
+        conn.execute("PRAGMA analysis_limit=400")
+        return conn
+    
     def _init_database(self):
         """Создание таблицы messages, если она не существует."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self._conn.cursor()
             
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY,
-                    chat_id INTEGER NOT NULL,
-                    sender TEXT,
-                    text TEXT,
-                    date TEXT NOT NULL,
-                    UNIQUE(id, chat_id)
-                )
-            ''')
+            # Размер страницы применяется только к новой (пустой) базе,
+            # поэтому задается до перевода в WAL
+            cursor.execute("PRAGMA page_size=8192")
+            # WAL сохраняется в файле базы: читатели (веб-панель, бот) не
+            # блокируются записью скрейпера
+            cursor.execute("PRAGMA journal_mode=WAL")
             
-            # Создаем индексы для быстрого поиска
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_chat_id ON messages(chat_id)
-            ''')
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_date ON messages(date)
-            ''')
+            init_messages_schema(cursor)
             
-            conn.commit()
-            conn.close()
             logger.info(f"База данных инициализирована: {self.db_path}")
         except Exception as e:
             logger.error(f"Ошибка при инициализации базы данных: {e}")
@@ -69,6 +379,10 @@ class Database:
         """
         Сохранение сообщения в базу данных с проверкой на дубликаты.
         
+        Дубликаты отсекает первичный ключ (chat_id, id): один INSERT OR
+        IGNORE вместо отдельной проверки SELECT перед вставкой. Запись идет
+        в отдельном потоке, чтобы fsync не блокировал цикл событий Telethon.
+        
         Args:
             message_id: ID сообщения
             chat_id: ID чата
@@ -80,36 +394,80 @@ class Database:
             True если сообщение сохранено, False если уже существует
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Проверяем, существует ли сообщение
-            cursor.execute('''
-                SELECT id FROM messages 
-                WHERE id = ? AND chat_id = ?
-            ''', (message_id, chat_id))
-            
-            if cursor.fetchone():
-                conn.close()
-                return False  # Сообщение уже существует
-            
-            # Сохраняем новое сообщение
-            date_str = date.strftime('%Y-%m-%d %H:%M:%S')
-            cursor.execute('''
-                INSERT INTO messages (id, chat_id, sender, text, date)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (message_id, chat_id, sender, text, date_str))
-            
-            conn.commit()
-            conn.close()
-            return True
-        except sqlite3.IntegrityError:
-            # Дубликат (на случай race condition)
-            return False
+            # Блокирующий вызов sqlite3 выполняется в потоке, не задерживая цикл событий
+            inserted = await asyncio.to_thread(
+                self._insert_messages, [(message_id, chat_id, sender, text, int(date.timestamp()))]
+            )
+            # 0, если сообщение уже существует
+            return inserted == 1
         except Exception as e:
             logger.error(f"Ошибка при сохранении сообщения: {e}")
             return False
     
+    async def save_messages_bulk(self, rows: List[tuple]) -> int:
+        """
+        Сохранение пачки сообщений в одной транзакции.
+        
+        Один COMMIT на всю пачку вместо фиксации каждой вставки; дубликаты
+        пропускаются так же, как в save_message.
+        
+        Args:
+            rows: Кортежи (message_id, chat_id, sender, text, date)
+            
+        Returns:
+            Количество новых сохраненных сообщений
+        """
+        if not rows:
+            return 0
+        try:
+            params = [
+                (message_id, chat_id, sender, text, int(date.timestamp()))
+                for message_id, chat_id, sender, text, date in rows
+            ]
+            return await asyncio.to_thread(self._insert_messages, params)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении пачки сообщений: {e}")
+            return 0
+    
+    def _insert_messages(self, params: List[tuple]) -> int:
+        """
+        Вставка строк в таблицу messages одной транзакцией (блокирующий вызов).
+        
+        Args:
+            params: Кортежи (id, chat_id, sender, text, date) для INSERT
+            
+        Returns:
+            Количество вставленных строк
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                cursor = self._conn.executemany('''
+                    INSERT OR IGNORE INTO messages (id, chat_id, sender, text, date)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+    def optimize(self):
+        """
+        Обновление статистики планировщика запросов (PRAGMA optimize).
+
+        Обычно ничего не делает и выполняет ANALYZE только для таблиц,
+        которые заметно изменились, поэтому вызов дешевый (блокирующий вызов).
+        Флаг 0x10000 проверяет все таблицы базы, а не только те, что читало
+        это соединение: summaries и summary_cache пишет бот, а статистику
+        для всех компонентов обновляет только скрейпер.
+        """
+        try:
+            with self._lock:
+                self._conn.execute("PRAGMA optimize=0x10002")
+        except Exception as e:
+            logger.error(f"Ошибка при оптимизации базы данных: {e}")
+
     def get_message_count(self, chat_id: Optional[int] = None) -> int:
         """
         Получить количество сообщений в базе.
@@ -121,17 +479,15 @@ class Database:
             Количество сообщений
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if chat_id:
-                cursor.execute('SELECT COUNT(*) FROM messages WHERE chat_id = ?', (chat_id,))
-            else:
-                cursor.execute('SELECT COUNT(*) FROM messages')
-            
-            count = cursor.fetchone()[0]
-            conn.close()
-            return count
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                if chat_id:
+                    cursor.execute('SELECT COUNT(*) FROM messages WHERE chat_id = ?', (chat_id,))
+                else:
+                    cursor.execute('SELECT COUNT(*) FROM messages')
+                
+                return cursor.fetchone()[0]
         except Exception as e:
             logger.error(f"Ошибка при получении количества сообщений: {e}")
             return 0
@@ -6,8 +6,13 @@
 
 import requests
 import logging
+import orjson
+import threading
+import time
 import urllib3
-from typing import Optional
+from requests.adapters import HTTPAdapter
+from typing import List, Optional, Tuple
+from urllib3.util.retry import Retry
 
 # Импортируем централизованный конфиг
 import config
@@ -20,6 +25,36 @@ logger = logging.getLogger(__name__)
 # URL endpoints GigaChat API
 OAUTH_URL = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
 CHAT_COMPLETIONS_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+TOKENS_COUNT_URL = "https://gigachat.devices.sberbank.ru/api/v1/tokens/count"
+
+# Общая HTTP-сессия: переиспользует TCP/TLS соединения между запросами.
+# Временные ошибки (429 и 5xx) и сбои установки соединения повторяются с
+# экспоненциальной задержкой; после исчерпания попыток возвращается последний
+# ответ для обычной обработки. Таймаут чтения не повторяется (read=0): запрос
+# к chat/completions уже мог быть обработан и оплачен, а повтор занял бы
+# несколько таймаутов подряд.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=3,
+        read=0,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False
+    )
+))
+
+# Токен считается устаревшим за столько секунд до фактического истечения
+TOKEN_EXPIRY_MARGIN = 60
+# Время жизни токена, если API не вернул expires_at (токены GigaChat живут 30 минут)
+DEFAULT_TOKEN_TTL = 30 * 60
+
+# Кэш OAuth токена: значение и момент истечения (unix time, секунды)
+_token_cache = {"value": None, "exp": 0.0}
+_token_lock = threading.Lock()
 
 
 class GigaChatError(Exception):
@@ -41,8 +76,8 @@ def get_access_token() -> str:
     """
     Получает OAuth токен для доступа к GigaChat API.
     
-    Использует Basic Auth с CLIENT_ID и CLIENT_SECRET для получения access_token.
-    Полученный токен затем используется в Bearer авторизации для API запросов.
+    Токен кэшируется до истечения срока действия, поэтому повторные вызовы
+    (например, для каждой части длинного текста) не делают новый запрос.
     
     Returns:
         Access token (строка)
@@ -51,10 +86,92 @@ def get_access_token() -> str:
         GigaChatAuthError: При ошибке аутентификации
         GigaChatError: При других ошибках
     """
-    client_id = config.GIGACHAT_CLIENT_ID
-    client_secret = config.GIGACHAT_CLIENT_SECRET
+    with _token_lock:
+        if _token_cache["value"] and time.time() < _token_cache["exp"] - TOKEN_EXPIRY_MARGIN:
+            return _token_cache["value"]
+        
+        access_token, expires_at = _request_access_token()
+        _token_cache["value"] = access_token
+        _token_cache["exp"] = expires_at
+        return access_token
+
+
+def invalidate_access_token(access_token: Optional[str] = None):
+    """
+    Сбрасывает кэшированный OAuth токен.
+    
+    Args:
+        access_token: Отклоненный токен (опционально). Если указан, кэш
+            сбрасывается, только пока в нем этот же токен - параллельные
+            запросы с одним устаревшим токеном не сбрасывают уже полученный новый.
+    """
+    with _token_lock:
+        if access_token is None or _token_cache["value"] == access_token:
+            _token_cache["value"] = None
+            _token_cache["exp"] = 0.0
+
+
+def authorized_post(url: str, payload: dict, access_token: Optional[str] = None, timeout: int = 60) -> requests.Response:
+    """
+    Отправляет POST-запрос к GigaChat API с Bearer токеном через общую сессию.
+    
+    Если API отвечает 401 (токен отозван или истек раньше expires_at),
+    кэш токена сбрасывается и запрос один раз повторяется с новым токеном.
     
-    if not client_id or not client_secret:
+    Args:
+        url: URL метода API
+        payload: Тело запроса (JSON)
+        access_token: Access token (опционально, если None - берется из get_access_token)
+        timeout: Таймаут запроса в секундах
+        
+    Returns:
+        Ответ API
+        
+    Raises:
+        GigaChatAuthError: При ошибке получения нового токена
+        requests.exceptions.RequestException: При сетевой ошибке
+    """
+    access_token = access_token or get_access_token()
+    # Тело сериализуется orjson один раз и переиспользуется при повторе
+    body = orjson.dumps(payload)
+    for attempt in range(2):
+        # verify=False отключает проверку SSL сертификата (для корпоративных прокси)
+        response = SESSION.post(
+            url,
+            data=body,
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json"
+            },
+            timeout=timeout,
+            verify=False
+        )
+        if response.status_code != 401 or attempt:
+            return response
+        logger.warning("Токен отклонен API (401), запрашиваю новый...")
+        invalidate_access_token(access_token)
+        access_token = get_access_token()
+    return response
+
+
+def _request_access_token() -> Tuple[str, float]:
+    """
+    Запрашивает новый OAuth токен у GigaChat API.
+    
+    Использует Basic Auth с CLIENT_ID и CLIENT_SECRET для получения access_token.
+    Полученный токен затем используется в Bearer авторизации для API запросов.
+    
+    Returns:
+        Кортеж (access token, момент истечения токена в unix time)
+        
+    Raises:
+        GigaChatAuthError: При ошибке аутентификации
+        GigaChatError: При других ошибках
+    """
+    try:
+        client_id = config.get_secret("GIGACHAT_CLIENT_ID")
+        client_secret = config.get_secret("GIGACHAT_CLIENT_SECRET")
+    except RuntimeError:
         raise GigaChatAuthError(
             "GIGACHAT_CLIENT_ID и GIGACHAT_CLIENT_SECRET должны быть установлены в .env файле"
         )
@@ -79,7 +196,7 @@ def get_access_token() -> str:
         # Используем Basic Auth: Authorization: Basic <base64(client_id:client_secret)>
         # requests автоматически создаст заголовок Authorization с Basic Auth
         # verify=False отключает проверку SSL сертификата (для корпоративных прокси)
-        response = requests.post(
+        response = SESSION.post(
             OAUTH_URL,
             data=auth_data,
             auth=(client_id, client_secret),
@@ -95,14 +212,21 @@ def get_access_token() -> str:
         
         if response.status_code == 200:
             try:
-                token_data = response.json()
+                token_data = orjson.loads(response.content)
                 access_token = token_data.get("access_token")
                 
                 if not access_token:
                     raise GigaChatAuthError("Токен не получен в ответе API")
                 
+                # expires_at приходит в миллисекундах
+                expires_at = token_data.get("expires_at")
+                if expires_at:
+                    expires_at = expires_at / 1000
+                else:
+                    expires_at = time.time() + DEFAULT_TOKEN_TTL
+                
                 logger.info("OAuth токен успешно получен")
-                return access_token
+                return access_token, expires_at
             except ValueError as e:
                 error_msg = f"Ошибка парсинга JSON ответа: {response.text}"
                 logger.error(error_msg)
@@ -110,7 +234,7 @@ def get_access_token() -> str:
         else:
             # Пытаемся получить детальную информацию об ошибке
             try:
-                error_json = response.json()
+                error_json = orjson.loads(response.content)
                 error_message = error_json.get("message") or error_json.get("error_description") or error_json.get("error")
                 error_code = error_json.get("code")
                 
@@ -133,6 +257,8 @@ def get_access_token() -> str:
             logger.error(error_msg)
             raise GigaChatAuthError(error_msg)
             
+    except GigaChatError:
+        raise
     except requests.exceptions.RequestException as e:
         error_msg = f"Ошибка при запросе токена: {str(e)}"
         logger.error(error_msg)
@@ -143,6 +269,53 @@ def get_access_token() -> str:
         raise GigaChatError(error_msg)
 
 
+def count_tokens(texts: List[str], access_token: Optional[str] = None) -> List[int]:
+    """
+    Подсчитывает количество токенов в текстах токенизатором GigaChat.
+    
+    Все тексты отправляются одним запросом.
+    
+    Args:
+        texts: Список текстов
+        access_token: Access token (опционально, если None - берется из get_access_token)
+        
+    Returns:
+        Список количеств токенов в том же порядке, что и texts
+        
+    Raises:
+        GigaChatAPIError: При ошибке запроса к API
+        GigaChatError: При других ошибках
+    """
+    try:
+        response = authorized_post(
+            TOKENS_COUNT_URL,
+            {"model": "GigaChat", "input": texts},
+            access_token,
+            timeout=30
+        )
+        
+        if response.status_code != 200:
+            error_msg = f"Ошибка подсчета токенов: {response.status_code} - {response.text}"
+            logger.error(error_msg)
+            raise GigaChatAPIError(error_msg)
+        
+        counts = [item["tokens"] for item in orjson.loads(response.content)]
+        if len(counts) != len(texts):
+            raise GigaChatAPIError("Некорректный ответ API при подсчете токенов")
+        return counts
+        
+    except GigaChatError:
+        raise
+    except requests.exceptions.RequestException as e:
+        error_msg = f"Ошибка при запросе к API: {str(e)}"
+        logger.error(error_msg)
+        raise GigaChatAPIError(error_msg)
+    except Exception as e:
+        error_msg = f"Неожиданная ошибка при подсчете токенов: {str(e)}"
+        logger.error(error_msg)
+        raise GigaChatError(error_msg)
+
+
 def generate_summary(text: str) -> str:
     """
     Генерирует краткую выжимку (summary) текста с помощью GigaChat API.
@@ -161,9 +334,6 @@ def generate_summary(text: str) -> str:
         raise ValueError("Текст не может быть пустым")
     
     try:
-        # Получаем токен доступа
-        access_token = get_access_token()
-        
         logger.info("Отправка запроса на генерацию summary...")
         
         # Подготовка данных для запроса
@@ -181,23 +351,13 @@ def generate_summary(text: str) -> str:
             ]
         }
         
-        # Отправка запроса с Bearer токеном
+        # Отправка запроса с Bearer токеном через общую сессию (keep-alive)
         # Используем Bearer Auth: Authorization: Bearer <access_token>
         # Токен получен через Basic Auth в get_access_token()
-        # verify=False отключает проверку SSL сертификата (для корпоративных прокси)
-        response = requests.post(
-            CHAT_COMPLETIONS_URL,
-            json=request_data,
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            },
-            timeout=60,
-            verify=False
-        )
+        response = authorized_post(CHAT_COMPLETIONS_URL, request_data)
         
         if response.status_code == 200:
-            response_data = response.json()
+            response_data = orjson.loads(response.content)
             
             # Извлекаем ответ из структуры ответа GigaChat
             choices = response_data.get("choices", [])
@@ -9,33 +9,66 @@
 """
 
 import asyncio
+import contextlib
 import logging
+import logging.handlers
 import sys
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, utils
 from telethon.errors import SessionPasswordNeededError, FloodWaitError
 from telethon.tl.types import User, Channel, Chat
 
+# uvloop - более быстрый цикл событий на libuv (необязательная зависимость,
+# недоступна на Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Add project root to the Python path
 sys.path.append(str(Path(__file__).resolve().parents[2]))
 
 import config
 from database import Database
 
+# Каталог data/ должен существовать до создания файла лога
+config.ensure_data_dir()
+
 # Настройка логирования
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Записи в файл копятся в памяти и пишутся пачками: по 200 штук, сразу при
+# WARNING и выше, раз в LOG_FLUSH_INTERVAL секунд (см. main) и при завершении
+# процесса (logging.shutdown)
+_file_handler = logging.FileHandler(config.LOG_PATH, encoding='utf-8')
+_file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+_log_buffer = logging.handlers.MemoryHandler(
+    capacity=200,
+    flushLevel=logging.WARNING,
+    target=_file_handler
+)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler(config.LOG_PATH, encoding='utf-8'),
+        _log_buffer,
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Окно (секунды), в течение которого новые сообщения копятся для записи одной пачкой
+FLUSH_INTERVAL = 0.2
+# Размер пачки сообщений, сохраняемой одной транзакцией при загрузке истории чата
+SAVE_BATCH_SIZE = 500
+# Период (в секундах) обновления статистики планировщика SQLite
+OPTIMIZE_INTERVAL = 900
+# Период (в секундах) сброса накопленных записей лога в файл: на тихом чате
+# буфер не заполняется, а при аварийном завершении процесса он теряется
+LOG_FLUSH_INTERVAL = 5
+
 
 class TelegramBot:
     """Класс для работы с Telegram через Telethon."""
@@ -43,12 +76,19 @@ class TelegramBot:
     def __init__(self, db: Database):
         """Инициализация клиента Telethon."""
         self.client = TelegramClient(
-            str(config.SESSION_PATH),
+            config.SESSION_PATH,
             config.API_ID,
             config.API_HASH
         )
         self.db = db
         self.is_running = False
+        # Новые сообщения, ожидающие пакетной записи в базу
+        self._pending = asyncio.Queue()
+        self._flush_task = None
+        # Кэш имен отправителей: ID пира -> имя
+        self._sender_cache: Dict[int, str] = {}
+        # Кэш названий чатов: ID пира -> название
+        self._chat_title_cache: Dict[int, str] = {}
     
     async def connect(self):
         """
@@ -109,57 +149,117 @@ class TelegramBot:
             logger.error(f"Ошибка при получении диалогов: {e}")
             return []
     
+    def _resolve_sender_name(self, sender) -> Optional[str]:
+        """
+        Имя отправителя сообщения для сохранения в базу.
+        
+        Результат кэшируется по ID пира: в чатах пишут одни и те же люди,
+        и имя не пересобирается для каждого сообщения.
+        
+        Args:
+            sender: Сущность отправителя (User, Channel, Chat) или None
+            
+        Returns:
+            Имя отправителя или None, если его не удалось определить
+        """
+        if sender is None:
+            return None
+        
+        peer_id = utils.get_peer_id(sender)
+        sender_name = self._sender_cache.get(peer_id)
+        if sender_name is None:
+            if isinstance(sender, User):
+                sender_name = f"{sender.first_name or ''} {sender.last_name or ''}".strip()
+                if not sender_name:
+                    sender_name = sender.username or f"User {sender.id}"
+            elif isinstance(sender, (Channel, Chat)):
+                sender_name = sender.title
+            else:
+                return None
+            self._sender_cache[peer_id] = sender_name
+        return sender_name
+    
+    def _chat_title(self, chat) -> str:
+        """
+        Название чата для вывода в лог.
+        
+        Результат кэшируется по ID пира, как и имена отправителей: сырые
+        chat.id пользователя, группы и канала могут совпадать, а ID пира
+        различается по типу (у каналов -100..., у групп отрицательный).
+        
+        Args:
+            chat: Сущность чата (Channel, Chat или User для личных сообщений)
+            
+        Returns:
+            Название чата
+        """
+        peer_id = utils.get_peer_id(chat)
+        chat_title = self._chat_title_cache.get(peer_id)
+        if chat_title is None:
+            chat_title = chat.title if hasattr(chat, 'title') else (
+                f"{chat.first_name or ''} {chat.last_name or ''}".strip()
+                if hasattr(chat, 'first_name') else f"Chat {chat.id}"
+            )
+            self._chat_title_cache[peer_id] = chat_title
+        return chat_title
+    
+    async def iter_chat_messages(self, chat_id: int, limit: int = 100):
+        """
+        Потоковое чтение последних N сообщений из чата.
+        
+        Сообщения не накапливаются в памяти: каждое превращается в строку
+        для базы данных и сразу отдается вызывающему коду.
+        
+        Args:
+            chat_id: ID чата
+            limit: Количество сообщений для получения
+            
+        Yields:
+            Кортежи (message_id, chat_id, sender, text, date)
+        """
+        async for message in self.client.iter_messages(chat_id, limit=limit):
+            sender_name = self._resolve_sender_name(message.sender)
+            text = message.message or "[медиа/файл]"
+            
+            yield (message.id, chat_id, sender_name, text, message.date)
+    
     async def get_chat_messages(
         self,
         chat_id: int,
         limit: int = 100
-    ) -> List:
+    ) -> int:
         """
         Сбор последних N сообщений из выбранного чата.
         
+        Сообщения сохраняются пачками по SAVE_BATCH_SIZE, одной транзакцией
+        на пачку, поэтому память не растет вместе с limit.
+        
         Args:
             chat_id: ID чата
             limit: Количество сообщений для получения
             
         Returns:
-            Список сообщений
+            Количество полученных сообщений
         """
+        count = 0
+        saved = 0
         try:
             logger.info(f"Получение последних {limit} сообщений из чата {chat_id}...")
             
-            messages = []
-            async for message in self.client.iter_messages(chat_id, limit=limit):
-                messages.append(message)
-                
-                # Сохранение в базу данных
-                sender_name = None
-                if message.sender:
-                    if isinstance(message.sender, User):
-                        sender_name = f"{message.sender.first_name or ''} {message.sender.last_name or ''}".strip()
-                        if not sender_name:
-                            sender_name = message.sender.username or f"User {message.sender.id}"
-                    elif isinstance(message.sender, (Channel, Chat)):
-                        sender_name = message.sender.title
-                
-                text = message.message or "[медиа/файл]"
-                
-                saved = await self.db.save_message(
-                    message_id=message.id,
-                    chat_id=chat_id,
-                    sender=sender_name,
-                    text=text,
-                    date=message.date
-                )
-                
-                if saved:
-                    logger.debug(f"Сохранено сообщение {message.id} из чата {chat_id}")
+            rows = []
+            async for row in self.iter_chat_messages(chat_id, limit):
+                count += 1
+                rows.append(row)
+                if len(rows) >= SAVE_BATCH_SIZE:
+                    saved += await self.db.save_messages_bulk(rows)
+                    rows = []
+            saved += await self.db.save_messages_bulk(rows)
             
-            logger.info(f"Получено и сохранено {len(messages)} сообщений из чата {chat_id}")
-            return messages
+            logger.info(f"Получено {count} сообщений из чата {chat_id}, новых сохранено: {saved}")
             
         except Exception as e:
             logger.error(f"Ошибка при получении сообщений из чата {chat_id}: {e}")
-            return []
+        return count
     
     async def setup_new_message_handler(self):
         """Настройка обработчика новых сообщений в реальном времени."""
@@ -171,47 +271,52 @@ class TelegramBot:
                 message = event.message
                 chat = await event.get_chat()
                 
-                # Получаем информацию об отправителе
-                sender_name = "Unknown"
-                if message.sender:
-                    sender = await message.get_sender()
-                    if isinstance(sender, User):
-                        sender_name = f"{sender.first_name or ''} {sender.last_name or ''}".strip()
-                        if not sender_name:
-                            sender_name = sender.username or f"User {sender.id}"
-                    elif isinstance(sender, (Channel, Chat)):
-                        sender_name = sender.title
+                # Получаем информацию об отправителе: сущность уже пришла
+                # вместе с сообщением, отдельный запрос get_sender() не нужен
+                sender_name = self._resolve_sender_name(message.sender) or "Unknown"
                 
                 # Получаем текст сообщения
                 text = message.message or "[медиа/файл]"
                 
                 # Получаем название чата
-                chat_title = chat.title if hasattr(chat, 'title') else (
-                    f"{chat.first_name or ''} {chat.last_name or ''}".strip() 
-                    if hasattr(chat, 'first_name') else f"Chat {chat.id}"
-                )
+                chat_title = self._chat_title(chat)
                 
-                # Сохраняем в базу данных
-                saved = await self.db.save_message(
-                    message_id=message.id,
-                    chat_id=chat.id,
-                    sender=sender_name,
-                    text=text,
-                    date=message.date
-                )
+                # Ставим в очередь на сохранение: запись в базу идет пачками
+                self._pending.put_nowait((message.id, chat.id, sender_name, text, message.date))
                 
-                if saved:
-                    # Выводим короткий лог в консоль
-                    print(f"[{chat_title}] {sender_name}: {text[:100]}")
-                    logger.info(f"Новое сообщение сохранено: [{chat_title}] {sender_name}: {text[:100]}")
-                else:
-                    logger.debug(f"Сообщение {message.id} уже существует в базе")
+                # Короткий лог: StreamHandler выводит его и в консоль
+                logger.info(f"Новое сообщение: [{chat_title}] {sender_name}: {text[:100]}")
                     
             except Exception as e:
                 logger.error(f"Ошибка при обработке нового сообщения: {e}")
         
+        self._flush_task = asyncio.create_task(self._flush_pending())
         logger.info("Обработчик новых сообщений настроен")
     
+    async def _flush_pending(self):
+        """
+        Фоновая запись новых сообщений в базу данных.
+        
+        Сообщения, пришедшие в течение FLUSH_INTERVAL после первого, собираются
+        в одну пачку и сохраняются одной транзакцией. При отмене задачи уже
+        собранная пачка все равно записывается.
+        """
+        while True:
+            rows = [await self._pending.get()]
+            try:
+                await asyncio.sleep(FLUSH_INTERVAL)
+            finally:
+                await self._save_pending(rows)
+    
+    async def _save_pending(self, rows: Optional[List] = None):
+        """Сохраняет одной пачкой переданные строки и все ожидающие в очереди."""
+        rows = rows or []
+        while not self._pending.empty():
+            rows.append(self._pending.get_nowait())
+        if rows:
+            saved = await self.db.save_messages_bulk(rows)
+            logger.debug(f"Сохранено новых сообщений: {saved} из {len(rows)}")
+    
     async def start_listening(self):
         """Запуск live-слушателя новых сообщений."""
         if self.is_running:
@@ -228,21 +333,50 @@ class TelegramBot:
         """Отключение от Telegram."""
         logger.info("Отключение от Telegram...")
         await self.client.disconnect()
+        # Дописываем в базу сообщения, ожидающие сохранения
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flush_task
+            self._flush_task = None
+        await self._save_pending()
         self.is_running = False
 
 
+async def run_periodically(interval: float, func):
+    """
+    Периодический вызов блокирующей функции, пока работает скрейпер.
+
+    Функция выполняется в отдельном потоке, чтобы не задерживать цикл событий.
+    Так скрейпер обновляет статистику планировщика (он держит одно соединение
+    на весь срок работы, поэтому не при закрытии соединения) и сбрасывает
+    буфер лога в файл.
+
+    Args:
+        interval: Период в секундах
+        func: Функция без аргументов
+    """
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(func)
+
+
 async def main():
     """Основная функция для запуска скрейпера."""
     logger.info("Инициализация скрейпера...")
     db_instance = Database(db_path=config.DB_PATH)
     bot = TelegramBot(db=db_instance)
-    
+    periodic_tasks = [
+        asyncio.create_task(run_periodically(OPTIMIZE_INTERVAL, db_instance.optimize)),
+        asyncio.create_task(run_periodically(LOG_FLUSH_INTERVAL, _log_buffer.flush)),
+    ]
+
     try:
         await bot.connect()
         
         print("\n=== Запуск live-слушателя ===")
         print("Ожидание новых сообщений... (Ctrl+C для остановки)")
-        print("Формат вывода: [CHAT TITLE] sender: text\n")
+        print("Формат вывода: Новое сообщение: [CHAT TITLE] sender: text\n")
         
         await bot.start_listening()
         
@@ -251,6 +385,10 @@ async def main():
     except Exception as e:
         logger.error(f"Критическая ошибка в скрейпере: {e}")
     finally:
+        for task in periodic_tasks:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
         await bot.disconnect()
         logger.info("Скрейпер завершил работу")
 
@@ -262,8 +400,14 @@ def run():
         print("Получить учетные данные можно на https://my.telegram.org/apps")
         exit(1)
     
-    # Запуск основной асинхронной функции
-    asyncio.run(main())
+    # Запуск основной асинхронной функции. uvloop.run создает цикл uvloop
+    # без глобальной политики циклов событий (set_event_loop_policy устарел
+    # начиная с Python 3.12)
+    if uvloop is not None:
+        logger.info("Используется цикл событий uvloop")
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
 
 if __name__ == '__main__':
     run()
@@ -1,14 +1,20 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, g
 import sqlite3
+import json
+import os
+import queue
+import re
 import sys
 from pathlib import Path
 import logging
 import math
+from datetime import datetime, timezone
 
 # Add project root to the Python path
 sys.path.append(str(Path(__file__).resolve().parents[2]))
 
 import config
+from database import unpack_message_keys
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,19 +26,79 @@ app = Flask(__name__, template_folder='templates')
 # Path to the database from the unified config
 DB_PATH = config.DB_PATH
 
+# Idle connections kept for reuse between requests. Reusing a connection keeps
+# SQLite's page cache warm and skips the open/pragma setup on every request.
+_pool = queue.LifoQueue()
+POOL_SIZE = 8
+
 def get_db_connection():
-    """Creates a database connection. Returns None on error."""
+    """
+    Returns the current request's database connection. Returns None on error.
+
+    The connection is taken from the pool on first use within a request and
+    returned to it by release_db_connection when the app context tears down.
+    """
+    if 'db' in g:
+        return g.db
     try:
-        if not DB_PATH.exists():
-            logger.error(f"Database file not found at {DB_PATH}")
-            return None
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            if not os.path.exists(DB_PATH):
+                logger.error(f"Database file not found at {DB_PATH}")
+                return None
+            # Pooled connections move between request threads
+            conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            # Wait for the scraper's write lock instead of failing with "database is locked",
+            # and give readers a large page cache
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-65536")
+        g.db = conn
         return conn
     except sqlite3.Error as e:
         logger.error(f"Database connection error: {e}")
         return None
 
+@app.teardown_appcontext
+def release_db_connection(exc):
+    """Returns the request's connection to the pool, closing it if the pool is full."""
+    conn = g.pop('db', None)
+    if conn is None:
+        return
+    if conn.in_transaction:
+        conn.rollback()
+    if _pool.qsize() < POOL_SIZE:
+        _pool.put(conn)
+    else:
+        conn.close()
+
+def count_messages(cursor, summarized):
+    """
+    Returns the number of messages with the given summarized flag.
+
+    Reads the trigger-maintained counters table (a single primary-key lookup)
+    and falls back to COUNT(*) on databases the scraper has not upgraded yet.
+    """
+    key = 'processed' if summarized else 'new'
+    try:
+        cursor.execute('SELECT val FROM counters WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        if row is not None:
+            return row[0]
+    except sqlite3.OperationalError:
+        pass
+    cursor.execute('SELECT COUNT(*) FROM messages WHERE summarized = ?', (summarized,))
+    return cursor.fetchone()[0]
+
+@app.template_filter('datetimeformat')
+def datetimeformat(value):
+    """Formats a message date stored as unix time (UTC) for display."""
+    if not isinstance(value, int):
+        return value
+    return datetime.fromtimestamp(value, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
 @app.route('/')
 def index():
     """Page 1: Dashboard with statistics."""
@@ -43,21 +109,15 @@ def index():
     cursor = conn.cursor()
     
     try:
-        cursor.execute('SELECT COUNT(*) FROM messages')
-        total_messages = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM messages WHERE summarized = 1')
-        analyzed_messages = cursor.fetchone()[0]
+        analyzed_messages = count_messages(cursor, 1)
+        total_messages = analyzed_messages + count_messages(cursor, 0)
 
         cursor.execute('SELECT MAX(created_at) FROM summaries')
         last_summary = cursor.fetchone()[0]
     except sqlite3.OperationalError as e:
-        conn.close()
         # This can happen if tables don't exist yet
         return render_template('error.html', message=f"Database query failed. Have you run the bots to populate the data? Error: {e}"), 500
 
-    conn.close()
-
     stats = {
         'total_messages': total_messages,
         'analyzed_messages': analyzed_messages,
@@ -80,39 +140,63 @@ def list_messages():
     per_page = 20
     offset = (page - 1) * per_page
     
+    # Keyset cursor "<date>_<chat_id>_<id>" of the previous page's last row.
+    # Sequential "next" navigation seeks straight to it in the index; jumping
+    # to an arbitrary page number falls back to OFFSET. Message IDs repeat
+    # across chats, so the cursor needs chat_id to identify a row.
+    after = None
+    try:
+        after_date, after_chat_id, after_id = request.args.get('after', '').split('_')
+        after = (int(after_date), int(after_chat_id), int(after_id))
+    except ValueError:
+        pass
+    
     # Tab settings
     tab = request.args.get('tab', 'new', type=str)
     summarized_filter = 1 if tab == 'processed' else 0
 
     try:
         # Get total count for pagination
-        cursor.execute('SELECT COUNT(*) FROM messages WHERE summarized = ?', (summarized_filter,))
-        total = cursor.fetchone()[0]
+        total = count_messages(cursor, summarized_filter)
         total_pages = math.ceil(total / per_page)
         
         # Get messages for the current page
-        query = '''
-            SELECT id, chat_id, sender, text, date, summarized 
-            FROM messages 
-            WHERE summarized = ?
-            ORDER BY date DESC 
-            LIMIT ? OFFSET ?
-        '''
-        cursor.execute(query, (summarized_filter, per_page, offset))
+        if after:
+            query = '''
+                SELECT id, chat_id, sender, text, date, summarized 
+                FROM messages 
+                WHERE summarized = ? AND (date, chat_id, id) < (?, ?, ?)
+                ORDER BY date DESC, chat_id DESC, id DESC 
+                LIMIT ?
+            '''
+            cursor.execute(query, (summarized_filter, *after, per_page))
+        else:
+            query = '''
+                SELECT id, chat_id, sender, text, date, summarized 
+                FROM messages 
+                WHERE summarized = ?
+                ORDER BY date DESC, chat_id DESC, id DESC 
+                LIMIT ? OFFSET ?
+            '''
+            cursor.execute(query, (summarized_filter, per_page, offset))
         messages = cursor.fetchall()
 
     except sqlite3.OperationalError as e:
-        conn.close()
         return render_template('error.html', message=f"Database query failed: {e}"), 500
 
-    conn.close()
-    
+    if messages:
+        last = messages[-1]
+        next_cursor = f"{last['date']}_{last['chat_id']}_{last['id']}"
+    else:
+        next_cursor = None
+
     return render_template(
         'messages.html', 
         messages=messages,
         page=page,
         total_pages=total_pages,
-        tab=tab
+        tab=tab,
+        next_cursor=next_cursor
     )
 
 @app.route('/summaries')
@@ -124,25 +208,83 @@ def list_summaries():
 
     cursor = conn.cursor()
     try:
-        cursor.execute('SELECT id, summary_text, message_ids, message_count, created_at FROM summaries ORDER BY created_at DESC')
+        cursor.execute('SELECT id, summary_text, message_count, created_at FROM summaries ORDER BY created_at DESC')
         summaries = cursor.fetchall()
     except sqlite3.OperationalError as e:
-        conn.close()
         return render_template('error.html', message=f"Database query failed. Have you run the bot to generate summaries? Error: {e}"), 500
         
-    conn.close()
     return render_template('summaries.html', summaries=summaries)
 
+# The key list is bound as a single JSON array, so one prepared statement serves
+# any number of keys (an IN (?, ?, ...) list is a new statement per length).
+# Messages are keyed by (chat_id, id): IDs are only unique within a chat.
+MESSAGES_BY_KEYS_QUERY = """
+    SELECT id, sender, chat_id, datetime(date, 'unixepoch') AS date, text
+    FROM messages
+    WHERE (chat_id, id) IN (
+        SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+    )
+"""
+# Upper bound on IDs per request
+MAX_MESSAGE_IDS = 10_000
+# Comma-separated "chat_id:id" tokens. Chat IDs may be negative (channels and
+# groups); message IDs are all digits. Malformed tokens such as "12a", "-5" or
+# a bare ID without its chat are skipped whole. Matching bytes keeps the scan
+# ASCII-only.
+_KEY_RE = re.compile(rb'(?:^|,)(-?\d+):(\d+)(?=,|$)')
+
+def fetch_messages(cursor, message_keys):
+    """Returns message details for (chat_id, id) keys."""
+    if not message_keys:
+        return []
+    cursor.execute(MESSAGES_BY_KEYS_QUERY, (json.dumps(message_keys),))
+    return [dict(row) for row in cursor.fetchall()]
+
+@app.route('/api/summaries/<int:summary_id>/messages')
+def get_summary_messages(summary_id):
+    """
+    API endpoint to get the messages a summary was built from.
+
+    The message keys are unpacked from summaries.message_ids on the server: a
+    summary can cover thousands of messages, and listing them in the URL would
+    exceed gunicorn's request line limit (8190 bytes at most).
+    """
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    cursor = conn.cursor()
+    cursor.execute('SELECT chat_id, message_ids FROM summaries WHERE id = ?', (summary_id,))
+    summary = cursor.fetchone()
+    if summary is None:
+        return jsonify({"error": "Summary not found"}), 404
+
+    keys = unpack_message_keys(summary['message_ids'], summary['chat_id'])
+    message_keys = [key for key in keys if key[0] is not None]
+    if len(message_keys) < len(keys):
+        # Legacy all-chats summary the bot has not converted yet (it does so
+        # on startup); looking messages up by bare ID would scan the table.
+        logger.warning(f"Summary {summary_id} has message IDs without a chat, skipping them")
+    return jsonify(fetch_messages(cursor, message_keys))
+
 @app.route('/api/messages_by_ids')
 def get_messages_by_ids():
-    """API endpoint to get details for multiple messages by their IDs."""
+    """
+    API endpoint to get details for multiple messages.
+
+    The ids parameter lists message keys as "chat_id:id".
+    """
     message_ids_str = request.args.get('ids')
     if not message_ids_str:
         return jsonify({"error": "No message IDs provided"}), 400
 
-    message_ids = [int(id) for id in message_ids_str.split(',') if id.isdigit()]
-    if not message_ids:
+    tokens = _KEY_RE.findall(message_ids_str.encode())
+    if not tokens:
         return jsonify({"error": "Invalid message IDs"}), 400
+    if len(tokens) > MAX_MESSAGE_IDS:
+        logger.warning(f"Too many message IDs requested ({len(tokens)}), returning the first {MAX_MESSAGE_IDS}")
+        tokens = tokens[:MAX_MESSAGE_IDS]
+    message_keys = [(int(chat_id), int(message_id)) for chat_id, message_id in tokens]
 
     conn = get_db_connection()
     if not conn:
@@ -150,24 +292,36 @@ def get_messages_by_ids():
 
     cursor = conn.cursor()
     
-    placeholders = ','.join('?' for _ in message_ids)
-    query = f'SELECT id, sender, chat_id, date, text FROM messages WHERE id IN ({placeholders})'
-    
-    cursor.execute(query, message_ids)
-    messages = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    
-    return jsonify(messages)
+    return jsonify(fetch_messages(cursor, message_keys))
 
 def run():
     """Запускает веб-приложение Flask."""
-    if not DB_PATH.exists():
+    if not os.path.exists(DB_PATH):
         print("="*60)
         print("WARNING: Database file not found!")
         print(f"Expected location: {DB_PATH}")
         print("Please ensure the scraper has been run at least once (`python run.py scrape`).")
         print("="*60)
     
+    if config.PRODUCTION == '1':
+        # Production server: gunicorn replaces the current process. gthread
+        # workers serve requests concurrently instead of one at a time.
+        workers = str(os.cpu_count() or 1)
+        logger.info(f"Запуск веб-приложения через gunicorn ({workers} workers)...")
+        try:
+            os.execvp("gunicorn", [
+                "gunicorn",
+                "-k", "gthread",
+                "-w", workers,
+                "--threads", "8",
+                "--preload",
+                "-b", "127.0.0.1:5001",
+                "--chdir", config.BASE_DIR,
+                "wsgi:app",
+            ])
+        except FileNotFoundError:
+            logger.error("gunicorn не найден, используется сервер разработки Flask")
+
     logger.info("Запуск веб-приложения Flask...")
     app.run(debug=True, port=5001)
 
@@ -0,0 +1,20 @@
+"""
+WSGI entry point for serving the web dashboard with a production server.
+
+Example (run from the project root):
+    gunicorn -k gthread -w 4 --threads 8 --preload -b 127.0.0.1:5001 wsgi:app
+
+--preload imports the application once in the master process before forking
+workers. Database connections are opened lazily per request, so every worker
+starts with an empty connection pool and never shares a SQLite handle with
+the master.
+"""
+import os
+import sys
+
+# Adds src to the Python path, as run.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from web.main import app  # noqa: E402
+
+__all__ = ("app",)